@@ -0,0 +1,83 @@
+import threading
+import time
+
+
+class Balancer(object):
+    """Chooses one of equivalent endpoints for every request.
+
+    Endpoints are chosen by least outstanding requests or round robin
+    policy. Failed endpoint is skipped for `failure_cooldown` seconds
+    (passive health checking) unless all endpoints are failed.
+    """
+
+    LEAST_OUTSTANDING = "least_outstanding"
+    ROUND_ROBIN = "round_robin"
+
+    def __init__(self, endpoints, policy=LEAST_OUTSTANDING, failure_cooldown=5.0):
+        if not len(endpoints):
+            raise ValueError("Balancer needs at least one endpoint")
+
+        if policy not in [self.LEAST_OUTSTANDING, self.ROUND_ROBIN]:
+            raise ValueError("Unknown balancing policy `{}`".format(policy))
+
+        self.endpoints = list(endpoints)
+        self.policy = policy
+        self.failure_cooldown = failure_cooldown
+
+        self.outstanding = {endpoint: 0 for endpoint in self.endpoints}
+        self.failed_until = {endpoint: 0.0 for endpoint in self.endpoints}
+        self.failures = {endpoint: 0 for endpoint in self.endpoints}
+
+        self._next_index = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude=()):
+        with self._lock:
+            now = time.monotonic()
+
+            candidates = [endpoint for endpoint in self.endpoints
+                          if endpoint not in exclude]
+            if not len(candidates):
+                candidates = self.endpoints
+
+            healthy = [endpoint for endpoint in candidates
+                       if self.failed_until[endpoint] <= now]
+            if len(healthy):
+                candidates = healthy
+            else:
+                candidates = [min(candidates, key=lambda endpoint: self.failed_until[endpoint])]
+
+            # rotate start point so ties are resolved in round robin order
+            start = self._next_index % len(candidates)
+            candidates = candidates[start:] + candidates[:start]
+            self._next_index += 1
+
+            if self.policy == self.LEAST_OUTSTANDING:
+                endpoint = min(candidates, key=lambda endpoint: self.outstanding[endpoint])
+            else:
+                endpoint = candidates[0]
+
+            self.outstanding[endpoint] += 1
+            return endpoint
+
+    def release(self, endpoint, failed=False):
+        with self._lock:
+            self.outstanding[endpoint] -= 1
+
+            if failed:
+                self.failed_until[endpoint] = time.monotonic() + self.failure_cooldown
+                self.failures[endpoint] += 1
+            else:
+                self.failed_until[endpoint] = 0.0
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                endpoint: {
+                    "outstanding": self.outstanding[endpoint],
+                    "failures": self.failures[endpoint],
+                    "healthy": self.failed_until[endpoint] <= now,
+                }
+                for endpoint in self.endpoints
+            }
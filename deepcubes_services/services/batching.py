@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import deque
+
+
+class _PendingBatch(object):
+    """Items submitted by one caller and the slot for their results"""
+
+    def __init__(self, items):
+        self.items = items
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher(object):
+    """Merges concurrent calls of a batch function into one call.
+
+    Every `submit(items)` call is queued; a background worker takes queued
+    calls until `max_batch_size` items are collected or `max_wait_ms`
+    milliseconds passed since the first of them, runs `func` once on the
+    concatenated items and gives every caller back its own slice of the
+    results. When merged call fails, calls are retried one by one, so only
+    failed caller gets the error. Calls larger than `max_batch_size` are
+    split into chunks.
+    """
+
+    def __init__(self, func, max_batch_size=64, max_wait_ms=5):
+        self.func = func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, items):
+        items = list(items)
+        if not len(items):
+            return self.func(items)
+
+        # larger calls are split, so one call of `func` never exceeds the cap
+        chunks = [_PendingBatch(items[start:start + self.max_batch_size])
+                  for start in range(0, len(items), self.max_batch_size)]
+        with self._condition:
+            self._queue.extend(chunks)
+            self._condition.notify()
+
+        results = list()
+        for pending in chunks:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            results.extend(pending.results)
+
+        return results
+
+    def _collect(self):
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+
+            batch = [self._queue.popleft()]
+            size = len(batch[0].items)
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch_size:
+                if not self._queue:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                    continue
+
+                if size + len(self._queue[0].items) > self.max_batch_size:
+                    break
+
+                pending = self._queue.popleft()
+                batch.append(pending)
+                size += len(pending.items)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            try:
+                self._call(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0].error = e
+                    batch[0].done.set()
+                    continue
+
+                # one failed call should not fail calls merged with it
+                for pending in batch:
+                    try:
+                        self._call([pending])
+                    except Exception as e:
+                        pending.error = e
+                        pending.done.set()
+
+    def _call(self, batch):
+        items = [item for pending in batch for item in pending.items]
+
+        results = self.func(items)
+        if len(results) != len(items):
+            raise ValueError("Batch function returned {} results for {} items".format(
+                len(results), len(items)))
+
+        offset = 0
+        for pending in batch:
+            pending.results = results[offset:offset + len(pending.items)]
+            offset += len(pending.items)
+            pending.done.set()
@@ -0,0 +1,199 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask_json import as_json
+
+
+def vector_nbytes(vector):
+    """Approximate memory size of vector stored as numpy array or list"""
+
+    if hasattr(vector, 'nbytes'):
+        return vector.nbytes
+
+    return sys.getsizeof(vector) + len(vector) * sys.getsizeof(0.0)
+
+
+class LRUCache(object):
+    """Thread-safe LRU cache bounded by entries count and approximate bytes.
+
+    `max_bytes` equal to 0 disables the bytes bound, `sizeof` returns
+    approximate size of stored value. Entries older than `ttl` seconds
+    are treated as missed, `ttl` equal to 0 disables expiration.
+    """
+
+    def __init__(self, max_entries, max_bytes=0, sizeof=vector_nbytes, ttl=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+
+            value, size, expires_at = self._entries[key]
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                self.bytes -= size
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+
+            self._entries[key] = (value, size, expires_at)
+            self.bytes += size
+
+            while (len(self._entries) > self.max_entries
+                   or (self.max_bytes and self.bytes > self.max_bytes)):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            requests_count = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / requests_count if requests_count else 0.0,
+            }
+
+
+def cached_batch(func, cache, key_func):
+    """Wrap batch function to look up every item in cache first.
+
+    Only missed items (deduplicated by key) are passed to `func`, results
+    are returned in the original order.
+    """
+
+    def wrapper(items):
+        keys = [key_func(item) for item in items]
+        results = [cache.get(key) for key in keys]
+
+        missed = dict()
+        for item, key, result in zip(items, keys, results):
+            if result is None and key not in missed:
+                missed[key] = item
+
+        if len(missed):
+            computed = dict(zip(missed.keys(), func(list(missed.values()))))
+            for key, value in computed.items():
+                cache.put(key, value)
+
+            results = [computed[key] if result is None else result
+                       for key, result in zip(keys, results)]
+
+        return results
+
+    return wrapper
+
+
+class PredictionCache(object):
+    """LRU cache of model predictions keyed by model id, query and labels
+    filter. Queries are not normalized, as models patterns may match
+    whitespace. `invalidate(model_id)` makes all cached predictions of the
+    model unreachable, they are evicted from LRU later.
+    """
+
+    def __init__(self, max_entries, ttl=0):
+        self.cache = LRUCache(max_entries, sizeof=lambda prediction: 0, ttl=ttl)
+
+        self._generations = dict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, section):
+        """Create cache from `PREDICTION_CACHE_*` options, None if it is disabled"""
+
+        max_entries = config.getint(section, 'PREDICTION_CACHE_SIZE', fallback=0)
+        if not max_entries:
+            return None
+
+        return cls(max_entries, config.getfloat(section, 'PREDICTION_CACHE_TTL', fallback=0))
+
+    def invalidate(self, model_id):
+        with self._lock:
+            self._generations[model_id] = self._generations.get(model_id, 0) + 1
+
+    def get_model(self, model_id, get_model):
+        """Return generation of model and model fetched by `get_model(model_id)`.
+
+        Generation is read before and after model is fetched (which may
+        reload it), so predictions of replaced model are never cached under
+        generation of the new one and vice versa.
+        """
+
+        generation = self._get_generation(model_id)
+        while True:
+            model = get_model(model_id)
+
+            current_generation = self._get_generation(model_id)
+            if current_generation == generation:
+                return generation, model
+
+            generation = current_generation
+
+    def _get_generation(self, model_id):
+        with self._lock:
+            return self._generations.get(model_id, 0)
+
+    def predict(self, model_id, generation, queries, predict, labels=None):
+        """Return `predict(queries)` computing it only for missed queries"""
+
+        labels_key = tuple(sorted(labels)) if labels is not None else None
+
+        def get_key(query):
+            return (model_id, generation, query, labels_key)
+
+        return cached_batch(predict, self.cache, get_key)(queries)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def add_prediction_cache_route(app, prediction_cache):
+    """Serve stats of prediction cache (None if it is disabled) on `/prediction_cache_stats`"""
+
+    @app.route("/prediction_cache_stats", methods=["GET", "POST"])
+    @as_json
+    def prediction_cache_stats():
+        if prediction_cache is None:
+            return {"message": "Prediction cache is disabled"}
+
+        return prediction_cache.stats()
@@ -1,9 +1,22 @@
-from flask import Flask, request
-from flask_json import FlaskJSON, as_json, JsonError
+import threading
+
+from flask import Flask, Response, request
+from flask_json import FlaskJSON, as_json, json_response, JsonError
 
-from deepcubes.embedders import LocalEmbedder
 from deepcubes.cubes import Tokenizer
 
+from .batching import MicroBatcher
+from .cache import LRUCache, cached_batch
+from .embedders import create_local_embedder
+from .metrics import add_cache_metrics, create_service_metrics, instrument_app, label_request
+from .request_logging import log_request
+from .utils import normalize_query
+from .vectors_format import (
+    FORMAT_TO_MIMETYPE,
+    encode_vectors,
+    get_response_format,
+)
+
 
 class EmbedderService(object):
 
@@ -11,17 +24,51 @@ class EmbedderService(object):
         self.config = config
         self.logger = logger
 
+        self.batching = config.getboolean('embedder-service', 'BATCHING', fallback=False)
+        self.max_batch_size = config.getint('embedder-service', 'MAX_BATCH_SIZE',
+                                            fallback=64)
+        self.max_batch_wait_ms = config.getfloat('embedder-service', 'MAX_BATCH_WAIT_MS',
+                                                 fallback=5)
+
+        self.cache_size = config.getint('embedder-service', 'CACHE_SIZE', fallback=0)
+        self.cache_bytes = config.getint('embedder-service', 'CACHE_BYTES', fallback=0)
+        self.caches = dict()
+
+        self.embedders = None
+        self.encoders = None
+        self._load_lock = threading.Lock()
+        self.metrics = create_service_metrics()
+
+    def load_embedders(self):
+        """Load embedders once, they are shared by app and in-process clients"""
+
+        with self._load_lock:
+            if self.embedders is not None:
+                return
+
+            self.logger.info("Load embedders: {} and paths: {} ...".format(
+                list(self.config['embedders'].keys()),
+                list(self.config['embedders'].values())
+            ))
+
+            tokenizer = Tokenizer(Tokenizer.Mode.TOKEN)
+            embedders = {name: create_local_embedder(path, tokenizer)
+                         for name, path in self.config['embedders'].items()}
+
+            self.encoders = {name: self._create_encoders(name, embedder)
+                             for name, embedder in embedders.items()}
+            self.embedders = embedders
+
+            for name, caches in self.caches.items():
+                for kind, cache in caches.items():
+                    add_cache_metrics(self.metrics, "embedder_cache", cache.stats,
+                                      (("name", name), ("kind", kind)))
+
     def create_flask_app(self):
         self.logger.info("Started Embedder Server...")
 
-        self.logger.info("Load embedders: {} and paths: {} ...".format(
-            list(self.config['embedders'].keys()),
-            list(self.config['embedders'].values())
-        ))
-
-        tokenizer = Tokenizer(Tokenizer.Mode.TOKEN)
-        embedders = {name: LocalEmbedder(path, tokenizer)
-                     for name, path in self.config['embedders'].items()}
+        self.load_embedders()
+        embedders, encoders = self.embedders, self.encoders
 
         self.logger.info("Prepare Flask app...")
         app = Flask(__name__)
@@ -55,56 +102,102 @@ class EmbedderService(object):
                 raise JsonError(description=str(e), type=str(type(e).__name__))
 
         @app.route("/<name>/encode_tokens", methods=["POST"])
-        @as_json
         def encode_tokens(name):
             try:
-                self.logger.info("Received {} `{}` encode_tokens request from {}".format(
-                    request.method, name, request.remote_addr
-                ))
+                log_request(self.logger, "encode_tokens", method=request.method,
+                            remote_addr=request.remote_addr, name=name)
 
                 if name not in embedders:
                     self.logger.error("Attempt to use wrong embedder : {}".format(name))
                     raise ValueError("`{}` embedder doesn't exists".format(name))
 
-                embedder = embedders[name]
                 data = request.form if request.form else request.json
 
                 tokens = data["tokens"]
-                vectors = embedder.encode_tokens(tokens)
+                vectors = encoders[name]["tokens"](tokens)
+                label_request(name=name)
 
-                return {'vectors': vectors}
+                return self._vectors_response(data, vectors)
 
             except Exception as e:
                 self.logger.error('error when handling HTTP request', exc_info=True)
                 raise JsonError(description=str(e), type=str(type(e).__name__))
 
         @app.route("/<name>/encode_queries", methods=["POST"])
-        @as_json
         def encode_queries(name):
             try:
-                self.logger.info("Received {} `{}` encode_queries request from {}".format(
-                    request.method, name, request.remote_addr
-                ))
+                log_request(self.logger, "encode_queries", method=request.method,
+                            remote_addr=request.remote_addr, name=name)
 
                 if name not in embedders:
                     self.logger.error("Attempt to use wrong embedder : {}".format(name))
                     raise ValueError("`{}` embedder doesn't exists".format(name))
 
-                embedder = embedders[name]
                 data = request.form if request.form else request.json
 
                 queries = data["queries"]
-                vectors = embedder.encode_queries(queries)
+                vectors = encoders[name]["queries"](queries)
+                label_request(name=name)
 
-                return {'vectors': vectors}
+                return self._vectors_response(data, vectors)
 
             except Exception as e:
                 self.logger.error('error when handling HTTP request', exc_info=True)
                 raise JsonError(description=str(e), type=str(type(e).__name__))
 
+        @app.route("/<name>/cache_stats", methods=["GET", "POST"])
+        @as_json
+        def cache_stats(name):
+            try:
+                if name not in self.caches:
+                    raise ValueError("`{}` embedder has no cache".format(name))
+
+                return {kind: cache.stats() for kind, cache in self.caches[name].items()}
+
+            except Exception as e:
+                self.logger.error('error when handling HTTP request', exc_info=True)
+                raise JsonError(description=str(e), type=str(type(e).__name__))
+
+        instrument_app(app, self.metrics)
         FlaskJSON(app)
         return app
 
+    def _vectors_response(self, data, vectors):
+        vectors_format = get_response_format(data, request.accept_mimetypes)
+        if vectors_format == "json":
+            return json_response(vectors=vectors)
+
+        return Response(encode_vectors(vectors, vectors_format),
+                        mimetype=FORMAT_TO_MIMETYPE[vectors_format])
+
+    def _create_encoders(self, name, embedder):
+        encoders = {
+            "tokens": embedder.encode_tokens,
+            "queries": embedder.encode_queries,
+        }
+
+        if self.batching:
+            encoders = {
+                kind: MicroBatcher(encoder, self.max_batch_size,
+                                   self.max_batch_wait_ms).submit
+                for kind, encoder in encoders.items()
+            }
+
+        if self.cache_size:
+            self.caches[name] = {
+                kind: LRUCache(self.cache_size, self.cache_bytes)
+                for kind in encoders
+            }
+
+            encoders = {
+                "tokens": cached_batch(encoders["tokens"], self.caches[name]["tokens"],
+                                       tuple),
+                "queries": cached_batch(encoders["queries"], self.caches[name]["queries"],
+                                        normalize_query),
+            }
+
+        return encoders
+
     def run(self, port):
         app = self.create_flask_app()
         app.run(host="0.0.0.0", port=port, debug=False)
@@ -1,8 +1,15 @@
 import json
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from enum import Enum
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from deepcubes.embedders import (
     Embedder,
@@ -12,6 +19,11 @@ from deepcubes.embedders import (
 
 from deepcubes.cubes import Tokenizer
 
+from .balancer import Balancer
+from .cache import LRUCache, cached_batch
+from .utils import normalize_query
+from .vectors_format import FLOAT32_MIMETYPE, NPY_MIMETYPE, decode_vectors
+
 
 class FactoryType(Enum):
     LOCAL = 0
@@ -20,57 +32,449 @@ class FactoryType(Enum):
 
 class EmbedderFactory(EmbedderFactoryABC):
 
-    def __init__(self, path):
+    def __init__(self, path, session_params=None, cache_params=None, balancing_params=None):
         if is_url(path):
             self.factory_type = FactoryType.NETWORK
         else:
             self.factory_type = FactoryType.LOCAL
 
+        # network path can be comma separated list of equivalent embedder services
         self.path = path
+        self.urls = [url.strip().rstrip("/") for url in path.split(",") if url.strip()]
+
+        self.session_params = session_params if session_params is not None else dict()
+        self.balancing_params = balancing_params if balancing_params is not None else dict()
+
+        # (embedder_mode, tokenizer_mode) -> [embedder, references count]
+        self._embedders = dict()
+        self._embedders_lock = threading.Lock()
+
+        self.session = None
+        self.cache = None
+        self.executor = None
+        if self.factory_type == FactoryType.NETWORK:
+            session_params = dict(self.session_params)
+            if len(self.urls) > 1:
+                # failed request is retried on the next service by balancer,
+                # not on the same one
+                session_params["retries"] = 0
+            self.session = PooledSession(**session_params)
+
+            if cache_params is not None and cache_params.get("max_entries"):
+                self.cache = get_shared_cache(path, **cache_params)
+
+            if len(self.urls) > 1:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.session_params.get("pool_size", 10)
+                )
+
+    @classmethod
+    def from_config(cls, config, section):
+        """Create factory from `EMBEDDER_*` options of service config section"""
+
+        session_params = {
+            "pool_size": config.getint(section, 'EMBEDDER_POOL_SIZE', fallback=10),
+            "connect_timeout": config.getfloat(section, 'EMBEDDER_CONNECT_TIMEOUT',
+                                               fallback=3.0),
+            "read_timeout": config.getfloat(section, 'EMBEDDER_READ_TIMEOUT', fallback=30.0),
+            "retries": config.getint(section, 'EMBEDDER_RETRIES', fallback=3),
+            "backoff_factor": config.getfloat(section, 'EMBEDDER_BACKOFF', fallback=0.1),
+        }
+
+        cache_params = {
+            "max_entries": config.getint(section, 'EMBEDDER_CACHE_SIZE', fallback=0),
+            "max_bytes": config.getint(section, 'EMBEDDER_CACHE_BYTES', fallback=0),
+            "ttl": config.getfloat(section, 'EMBEDDER_CACHE_TTL', fallback=0),
+        }
+
+        balancing_params = {
+            "policy": config.get(section, 'EMBEDDER_BALANCING',
+                                 fallback=Balancer.LEAST_OUTSTANDING),
+            "failure_cooldown": config.getfloat(section, 'EMBEDDER_FAILURE_COOLDOWN',
+                                                fallback=5.0),
+            "chunk_size": config.getint(section, 'EMBEDDER_CHUNK_SIZE', fallback=0),
+        }
+
+        return cls(config.get(section, 'EMBEDDER_PATH'), session_params, cache_params,
+                   balancing_params)
 
-    def _get_full_url(self, mode):
-        return "{}/{}".format(self.path, mode)
+    def _get_full_urls(self, mode):
+        return ["{}/{}".format(url, mode) for url in self.urls]
 
     def _get_full_path(self, mode):
+        mmap_path = os.path.join(self.path, "{}.npy".format(mode))
+        if os.path.isfile(mmap_path):
+            return mmap_path
+
         return os.path.join(self.path, "{}.kv".format(mode))
 
     def create(self, embedder_mode, tokenizer_mode=Tokenizer.Mode.TOKEN):
+        """Return shared embedder, every call must be paired with `release`"""
+
+        tokenizer_mode = get_tokenizer_mode(tokenizer_mode)
+        key = (embedder_mode, tokenizer_mode)
+        with self._embedders_lock:
+            if key not in self._embedders:
+                self._embedders[key] = [self._create(embedder_mode, tokenizer_mode), 0]
+
+            self._embedders[key][1] += 1
+            return self._embedders[key][0]
+
+    def release(self, embedder):
+        """Drop reference to embedder, unused embedder is removed from registry"""
+
+        with self._embedders_lock:
+            for key, entry in self._embedders.items():
+                if entry[0] is embedder:
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        del self._embedders[key]
+                    return
+
+    def lease(self):
+        return EmbedderLease(self)
+
+    def embedders(self):
+        """Return currently shared embedders by `<embedder mode>/<tokenizer mode>` names"""
+
+        with self._embedders_lock:
+            return {
+                _get_embedder_key_name(key): embedder
+                for key, (embedder, _) in self._embedders.items()
+            }
+
+    def stats(self):
+        with self._embedders_lock:
+            return {
+                _get_embedder_key_name(key): references_count
+                for key, (_, references_count) in self._embedders.items()
+            }
+
+    def _create(self, embedder_mode, tokenizer_mode):
         if self.factory_type == FactoryType.NETWORK:
-            return NetworkEmbedder(self._get_full_url(embedder_mode))
+            return NetworkEmbedder(self._get_full_urls(embedder_mode), mode=embedder_mode,
+                                   session=self.session, cache=self.cache,
+                                   executor=self.executor, **self.balancing_params)
         else:
-            return LocalEmbedder(self._get_full_path(embedder_mode),
-                                 Tokenizer(tokenizer_mode))
+            return create_local_embedder(self._get_full_path(embedder_mode),
+                                         Tokenizer(tokenizer_mode))
+
+
+def get_tokenizer_mode(tokenizer_mode):
+    """`Tokenizer.Mode` of mode or its value, e.g. `"token"` from model params"""
+
+    return Tokenizer.Mode(getattr(tokenizer_mode, 'value', tokenizer_mode))
+
+
+def _get_embedder_key_name(key):
+    embedder_mode, tokenizer_mode = key
+    return "{}/{}".format(embedder_mode, tokenizer_mode.value)
+
+
+class EmbedderLease(object):
+    """Factory proxy that remembers created embedders to release them at once.
+
+    Pass it instead of factory to model `load` and call `release` when the
+    model is dropped.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.embedders = list()
+
+    def create(self, embedder_mode, tokenizer_mode=Tokenizer.Mode.TOKEN):
+        embedder = self.factory.create(embedder_mode, tokenizer_mode)
+        self.embedders.append(embedder)
+        return embedder
+
+    def release(self):
+        for embedder in self.embedders:
+            self.factory.release(embedder)
+
+        self.embedders = list()
+
+
+class ServiceEmbedderFactory(EmbedderFactory):
+    """Factory of embedders of `EmbedderService` running in the same process.
+
+    Embedder mode is the embedder service name, encoding calls go through
+    service batching and cache directly instead of HTTP.
+    """
+
+    def __init__(self, embedder_service):
+        super().__init__("")
+        self.embedder_service = embedder_service
+
+    def _create(self, embedder_mode, tokenizer_mode):
+        self.embedder_service.load_embedders()
+        if embedder_mode not in self.embedder_service.embedders:
+            raise ValueError("`{}` embedder doesn't exists".format(embedder_mode))
+
+        return ServiceEmbedder(self.embedder_service, embedder_mode)
+
+
+class ServiceEmbedder(Embedder):
+    """In-process client of `EmbedderService` embedder"""
+
+    def __init__(self, embedder_service, mode):
+        self.mode = mode
+        self.embedder = embedder_service.embedders[mode]
+        self.encoders = embedder_service.encoders[mode]
+
+    def encode_queries(self, queries):
+        return self.encoders["queries"](queries)
+
+    def encode_tokens(self, tokens_batch):
+        return self.encoders["tokens"](tokens_batch)
+
+    def get_tokenizer_mode(self):
+        return self.embedder.get_tokenizer_mode()
+
+    def get_embedder_mode(self):
+        return self.mode
+
+
+class SharedQueriesFactory(object):
+    """Factory proxy whose embedders encode the same queries once per `scope`.
+
+    Models of one pipeline (e.g. stages of multistage classifier) loaded
+    with it get the same proxy embedder for the same mode, so inside
+    `with factory.scope():` every query batch is embedded only once.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._embedders = dict()
+        self._embedders_lock = threading.Lock()
+        self._local = threading.local()
+
+    def create(self, embedder_mode, tokenizer_mode=Tokenizer.Mode.TOKEN):
+        tokenizer_mode = get_tokenizer_mode(tokenizer_mode)
+        key = (embedder_mode, tokenizer_mode)
+        with self._embedders_lock:
+            if key not in self._embedders:
+                embedder = self.factory.create(embedder_mode, tokenizer_mode)
+                self._embedders[key] = SharedQueriesEmbedder(embedder, self)
+
+            return self._embedders[key]
+
+    def embedders(self):
+        with self._embedders_lock:
+            return {
+                _get_embedder_key_name(key): embedder
+                for key, embedder in self._embedders.items()
+            }
+
+    @contextmanager
+    def scope(self):
+        if getattr(self._local, 'vectors', None) is not None:
+            yield
+            return
+
+        self._local.vectors = dict()
+        try:
+            yield
+        finally:
+            self._local.vectors = None
+
+    def get_scope_vectors(self):
+        """Vectors memo of current thread scope, None outside of scope"""
+
+        return getattr(self._local, 'vectors', None)
+
+
+class SharedQueriesEmbedder(Embedder):
+    """Embedder proxy created by `SharedQueriesFactory`"""
+
+    def __init__(self, embedder, factory):
+        self.embedder = embedder
+        self.factory = factory
+
+    def encode_queries(self, queries):
+        vectors = self.factory.get_scope_vectors()
+        if vectors is None:
+            return self.embedder.encode_queries(queries)
+
+        # vectors are memoized by query, so stages embedding subsets of
+        # queries reuse them too
+        missed = list(OrderedDict.fromkeys(
+            query for query in queries if (id(self), query) not in vectors))
+        if len(missed):
+            for query, vector in zip(missed, self.embedder.encode_queries(missed)):
+                vectors[(id(self), query)] = vector
+
+        return np.array([vectors[(id(self), query)] for query in queries])
+
+    def encode_tokens(self, tokens_batch):
+        return self.embedder.encode_tokens(tokens_batch)
+
+    def get_tokenizer_mode(self):
+        return self.embedder.get_tokenizer_mode()
+
+    def get_embedder_mode(self):
+        return self.embedder.get_embedder_mode()
+
+
+class StoredQueriesEmbedder(Embedder):
+    """Embedder proxy that reuses stored query vectors and records new ones.
+
+    Used for model training: only queries absent in `vectors` dict are
+    encoded. All vectors are float32, as generic bank and train data ones,
+    so stored and new phrases are trained alike. `detach` returns vectors
+    of all queries encoded since creation and turns proxy into plain
+    pass-through one.
+    """
+
+    def __init__(self, embedder, vectors=None):
+        self.embedder = embedder
+        self.stored_vectors = dict(vectors) if vectors is not None else dict()
+        self.used_vectors = dict()
+        self.encoded_count = 0
+        self.recording = True
+
+    def encode_queries(self, queries):
+        if not self.recording:
+            return self.embedder.encode_queries(queries)
+
+        missed = list(OrderedDict.fromkeys(
+            query for query in queries
+            if query not in self.stored_vectors and query not in self.used_vectors))
+
+        if len(missed):
+            self.encoded_count += len(missed)
+            for query, vector in zip(missed, self.embedder.encode_queries(missed)):
+                self.used_vectors[query] = np.asarray(vector, dtype=np.float32)
+
+        for query in queries:
+            if query not in self.used_vectors:
+                self.used_vectors[query] = self.stored_vectors[query]
+
+        return np.array([self.used_vectors[query] for query in queries], dtype=np.float32)
+
+    def encode_tokens(self, tokens_batch):
+        return self.embedder.encode_tokens(tokens_batch)
+
+    def detach(self):
+        vectors = self.used_vectors
+        self.stored_vectors, self.used_vectors = dict(), dict()
+        self.recording = False
+
+        return vectors
+
+    def get_tokenizer_mode(self):
+        return self.embedder.get_tokenizer_mode()
+
+    def get_embedder_mode(self):
+        return self.embedder.get_embedder_mode()
 
 
 class NetworkEmbedder(Embedder):
-    """Network embedder"""
+    """Network embedder
+
+    `url` is embedder url or list of urls of equivalent embedder services,
+    requests are spread between them by `Balancer`, which is shared by
+    embedders of all modes of the same services. Batches larger than
+    `chunk_size` are split into chunks encoded in parallel by `executor`.
+    """
 
     EMPTY_STRING = ""
 
-    def __init__(self, url, mode=None):
+    def __init__(self, url, mode=None, session=None, cache=None, executor=None,
+                 policy=Balancer.LEAST_OUTSTANDING, failure_cooldown=5.0, chunk_size=0):
+        urls = [url] if isinstance(url, str) else list(url)
+
         if mode is None:
-            mode = os.path.basename(url)
+            mode = os.path.basename(urls[0])
+
+        if session is None:
+            session = get_default_session()
 
         self.mode = mode
-        self.url = url
+        self.url = urls[0]
+        self.session = session
+        self.cache = cache
+        # service url -> embedder url, e.g. `http://host:3333` -> `http://host:3333/mode`
+        self.urls = OrderedDict((url.rstrip("/").rsplit("/", 1)[0], url) for url in urls)
+        self.balancer = get_shared_balancer(list(self.urls), policy, failure_cooldown)
+        self.executor = executor
+        self.chunk_size = chunk_size
 
     def encode_queries(self, queries):
-        data = {"queries": queries}
-        url = "{}/encode_queries".format(self.url)
-        return self._get_vectors(url, data)
+        if self.cache is None:
+            return self._encode_queries(queries)
+
+        return self._encode_cached(
+            self._encode_queries, queries,
+            lambda query: (self.mode, "queries", normalize_query(query))
+        )
 
     def encode_tokens(self, tokens_batch):
+        if self.cache is None:
+            return self._encode_tokens(tokens_batch)
+
+        return self._encode_cached(
+            self._encode_tokens, tokens_batch,
+            lambda tokens: (self.mode, "tokens", tuple(tokens))
+        )
+
+    def _encode_cached(self, encode, items, key_func):
+        # copy every row so cache doesn't keep whole response buffers alive
+        def encode_rows(missed_items):
+            return [np.array(vector) for vector in encode(missed_items)]
+
+        return np.array(cached_batch(encode_rows, self.cache, key_func)(items))
+
+    def _encode_queries(self, queries):
+        return self._encode_chunked("encode_queries", "queries", queries)
+
+    def _encode_tokens(self, tokens_batch):
         # TODO: fix this not idiomatic way to process empty tokens
         for tokens in tokens_batch:
             if not len(tokens):
                 tokens = [self.EMPTY_STRING]
 
-        data = {'tokens': tokens_batch}
-        url = "{}/encode_tokens".format(self.url)
-        return self._get_vectors(url, data)
+        return self._encode_chunked("encode_tokens", "tokens", tokens_batch)
+
+    def _encode_chunked(self, route, field, items):
+        if (self.executor is None or not self.chunk_size
+                or len(items) <= self.chunk_size):
+            return self._get_vectors(route, {field: items})
+
+        futures = [
+            self.executor.submit(self._get_vectors, route,
+                                 {field: items[start:start + self.chunk_size]})
+            for start in range(0, len(items), self.chunk_size)
+        ]
+
+        return np.concatenate([np.asarray(future.result()) for future in futures])
+
+    def _post(self, route, **kwargs):
+        """Send request to one of endpoints, try other endpoints on failure"""
+
+        tried = list()
+        while True:
+            endpoint = self.balancer.acquire(exclude=tried)
+            tried.append(endpoint)
+            last_attempt = len(tried) >= len(self.urls)
+
+            try:
+                response = self.session.post("{}/{}".format(self.urls[endpoint], route),
+                                             **kwargs)
+            except requests.RequestException:
+                self.balancer.release(endpoint, failed=True)
+                if last_attempt:
+                    raise
+                continue
+
+            failed = response.status_code >= 500
+            self.balancer.release(endpoint, failed=failed)
+            if failed and not last_attempt:
+                continue
+
+            return response
 
     def get_tokenizer_mode(self):
-        response = requests.post("{}/get_tokenizer_mode".format(self.url))
+        response = self._post("get_tokenizer_mode")
 
         if response.status_code != 200:
             raise ValueError("Network embedder error. Status code: {}.".format(
@@ -85,13 +489,18 @@ class NetworkEmbedder(Embedder):
     def get_embedder_mode(self):
         return self.mode
 
-    def _get_vectors(self, url, data):
-        response = requests.post(url, json=data)
+    def _get_vectors(self, route, data):
+        data["format"] = "float32"
+        response = self._post(route, json=data, headers={"Accept": FLOAT32_MIMETYPE})
 
         if response.status_code != 200:
             raise ValueError("Network embedder error. Status code: {}.".format(
                 response.status_code))
 
+        mimetype = response.headers.get("Content-Type", "").split(";")[0].strip()
+        if mimetype in [FLOAT32_MIMETYPE, NPY_MIMETYPE]:
+            return decode_vectors(response.content, mimetype)
+
         content = json.loads(response.text)
         if 'vectors' not in content:
             raise ValueError("Network embedder error. No `vectors` in output.")
@@ -99,6 +508,199 @@ class NetworkEmbedder(Embedder):
             return content['vectors']
 
 
+class PooledSession(requests.Session):
+    """Keep-alive session with bounded connection pool, retries and timeouts"""
+
+    def __init__(self, pool_size=10, connect_timeout=3.0, read_timeout=30.0,
+                 retries=3, backoff_factor=0.1):
+        super().__init__()
+        self.timeout = (connect_timeout, read_timeout)
+
+        # encode requests are idempotent, so POST requests are retried too,
+        # but not after read timeout, which would wait for hung service again
+        retry = Retry(total=retries, connect=retries, read=0, status=retries,
+                      backoff_factor=backoff_factor, status_forcelist=[502, 503, 504],
+                      allowed_methods=frozenset(["GET", "POST"]),
+                      raise_on_status=False)
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+_shared_caches = dict()
+_shared_caches_lock = threading.Lock()
+
+
+def get_shared_cache(url, max_entries, max_bytes=0, ttl=0):
+    """Vectors cache shared by all network embedders of one embedder service.
+
+    All factories of one url must use the same cache settings, otherwise
+    the cache created first would silently ignore later settings.
+    """
+
+    with _shared_caches_lock:
+        if url not in _shared_caches:
+            _shared_caches[url] = LRUCache(max_entries, max_bytes, ttl=ttl)
+
+        cache = _shared_caches[url]
+        settings = (max_entries, max_bytes, ttl)
+        if (cache.max_entries, cache.max_bytes, cache.ttl) != settings:
+            raise ValueError(
+                "Embedder cache of `{}` is already created with size {}, bytes {} and "
+                "ttl {}, got size {}, bytes {} and ttl {}".format(
+                    url, cache.max_entries, cache.max_bytes, cache.ttl, *settings))
+
+        return cache
+
+
+_shared_balancers = dict()
+_shared_balancers_lock = threading.Lock()
+
+
+def get_shared_balancer(urls, policy=Balancer.LEAST_OUTSTANDING, failure_cooldown=5.0):
+    """Balancer shared by network embedders of all modes of the same services,
+    so outstanding requests and failures of every service are counted once
+    """
+
+    key = tuple(sorted(urls))
+    with _shared_balancers_lock:
+        if key not in _shared_balancers:
+            _shared_balancers[key] = Balancer(urls, policy, failure_cooldown)
+
+        balancer = _shared_balancers[key]
+        if (balancer.policy, balancer.failure_cooldown) != (policy, failure_cooldown):
+            raise ValueError(
+                "Balancer of `{}` is already created with policy {} and failure cooldown "
+                "{}, got policy {} and failure cooldown {}".format(
+                    ", ".join(key), balancer.policy, balancer.failure_cooldown,
+                    policy, failure_cooldown))
+
+        return balancer
+
+
+def get_default_session():
+    """Session shared by network embedders created without explicit one"""
+
+    global _default_session
+
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = PooledSession()
+
+        return _default_session
+
+
+class MmapEmbedder(Embedder):
+    """Local embedder over read-only memory-mapped vectors.
+
+    Vectors are stored by `convert_to_mmap` as raw `.npy` matrix with
+    `.vocab` file (one token per line, line number is row index), so all
+    processes that map the same file share its physical pages.
+    """
+
+    def __init__(self, path, tokenizer, mode=None):
+        if mode is None:
+            mode = os.path.basename(path).split('.')[0]
+
+        self.mode = mode
+        self.path = path
+        self.tokenizer = tokenizer
+        self.vectors, self.vocab = load_mmap_vectors(path)
+
+    def encode_queries(self, queries):
+        return self.encode_tokens(self.tokenizer(queries))
+
+    def encode_tokens(self, tokens_batch):
+        vectors = list()
+        for tokens in tokens_batch:
+            indices = [self.vocab[token] for token in tokens if token in self.vocab]
+
+            if len(indices):
+                vectors.append(self.vectors[indices].mean(axis=0).tolist())
+            else:
+                vectors.append([0.0] * self.vectors.shape[1])
+
+        return vectors
+
+    def get_tokenizer_mode(self):
+        return self.tokenizer.mode.value
+
+    def get_embedder_mode(self):
+        return self.mode
+
+
+_mmap_vectors = dict()
+_mmap_vectors_lock = threading.Lock()
+
+
+def get_vocab_path(path):
+    return "{}.vocab".format(os.path.splitext(path)[0])
+
+
+def load_mmap_vectors(path):
+    """Map vectors matrix and read its vocab once per process"""
+
+    real_path = os.path.realpath(path)
+    with _mmap_vectors_lock:
+        if real_path not in _mmap_vectors:
+            vectors = np.load(real_path, mmap_mode='r')
+
+            with open(get_vocab_path(real_path), 'r', encoding='utf-8') as vocab_file:
+                vocab = {token.rstrip('\n'): index
+                         for index, token in enumerate(vocab_file)}
+
+            if len(vocab) != vectors.shape[0]:
+                raise ValueError("Vocab size {} doesn't match vectors count {} in {}".format(
+                    len(vocab), vectors.shape[0], path))
+
+            _mmap_vectors[real_path] = (vectors, vocab)
+
+        return _mmap_vectors[real_path]
+
+
+def convert_to_mmap(kv_path, out_path):
+    """Convert gensim KeyedVectors file to `.npy` matrix and `.vocab` file"""
+
+    from gensim.models import KeyedVectors
+
+    if not out_path.endswith('.npy'):
+        out_path = '{}.npy'.format(out_path)
+
+    keyed_vectors = KeyedVectors.load(kv_path)
+    if hasattr(keyed_vectors, 'index_to_key'):
+        tokens = keyed_vectors.index_to_key
+    else:
+        tokens = keyed_vectors.index2word
+
+    for token in tokens:
+        if '\n' in token:
+            raise ValueError("Token {!r} can't be stored in vocab file".format(token))
+
+    vectors = np.ascontiguousarray(keyed_vectors.vectors, dtype=np.float32)
+    np.save(out_path, vectors)
+
+    with open(get_vocab_path(out_path), 'w', encoding='utf-8') as vocab_file:
+        for token in tokens:
+            vocab_file.write('{}\n'.format(token))
+
+
+def create_local_embedder(path, tokenizer):
+    if path.endswith('.npy'):
+        return MmapEmbedder(path, tokenizer)
+    else:
+        return LocalEmbedder(path, tokenizer)
+
+
 def is_url(path):
     # TODO: need more sophisticated url checker
     return path.startswith("http")
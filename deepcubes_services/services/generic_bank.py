@@ -0,0 +1,56 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class GenericBank(object):
+    """Vectors of live dialog generic phrases shared by all models.
+
+    Generic data file (`<phrase>\\t<generic>` lines) is parsed and embedded
+    once per embedder mode and rebuilt only when file mtime changes.
+    Vectors are read-only, models trainings reuse them instead of
+    embedding generics again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        # embedder mode -> (file mtime, {phrase: vector})
+        self._banks = dict()
+        self._lock = threading.Lock()
+
+        self.builds = 0
+
+    def get_vectors(self, embedder):
+        mode = embedder.get_embedder_mode()
+        mtime = os.stat(self.path).st_mtime_ns
+
+        with self._lock:
+            bank = self._banks.get(mode)
+            if bank is not None and bank[0] == mtime:
+                return bank[1]
+
+            phrases = self.read_phrases()
+            vectors = np.array(embedder.encode_queries(phrases), dtype=np.float32)
+            vectors.flags.writeable = False
+
+            self._banks[mode] = (mtime, dict(zip(phrases, vectors)))
+            self.builds += 1
+
+            return self._banks[mode][1]
+
+    def read_phrases(self):
+        with open(self.path, "r", encoding="utf-8") as generic_file:
+            phrases = [line.rstrip("\n").split("\t")[0] for line in generic_file]
+
+        return list(OrderedDict.fromkeys(phrase for phrase in phrases if phrase))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "modes": sorted(self._banks),
+                "phrases": {mode: len(bank[1]) for mode, bank in self._banks.items()},
+                "builds": self.builds,
+            }
@@ -0,0 +1,108 @@
+from flask import Flask
+from flask_json import FlaskJSON, as_json
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.serving import run_simple
+
+from .embedder_service import EmbedderService
+from .embedders import EmbedderFactory, ServiceEmbedderFactory
+from .intent_classifier_service import IntentClassifierService
+from .multistage_classifier_service import MultistageClassifierService
+from .sentiment_service import SentimentService
+from .vera_live_dialog_service import VeraLiveDialogService
+
+
+SERVICE_NAMES = ["embedder", "classifier", "multistage", "live_dialog", "sentiment"]
+
+
+class ServiceHost(object):
+    """Runs several services in one process under `/<service name>` prefixes.
+
+    Services are listed in `SERVICES` option of `[host]` config section and
+    read their usual config sections. All services share one embedder
+    factory: embedders of mounted embedder service are called in-process,
+    otherwise `EMBEDDER_*` options of `[host]` section are used.
+    """
+
+    def __init__(self, config, logger):
+        self.config = config
+        self.logger = logger
+
+        names = [name.strip() for name in config.get('host', 'SERVICES').split(',')
+                 if name.strip()]
+        for name in names:
+            if name not in SERVICE_NAMES:
+                raise ValueError("Unknown service `{}`, possible: {}".format(
+                    name, ", ".join(SERVICE_NAMES)))
+
+        self.services = dict()
+        if "embedder" in names:
+            self.services["embedder"] = EmbedderService(config, logger)
+            self.embedder_factory = ServiceEmbedderFactory(self.services["embedder"])
+        elif set(names) & {"classifier", "multistage", "live_dialog"}:
+            self.embedder_factory = EmbedderFactory.from_config(config, 'host')
+        else:
+            self.embedder_factory = None
+
+        if "classifier" in names:
+            self.services["classifier"] = IntentClassifierService(
+                config, logger, self._get_models_ids('CLASSIFIER_MODELS'),
+                embedder_factory=self.embedder_factory)
+
+        if "multistage" in names:
+            self.services["multistage"] = MultistageClassifierService(
+                config, logger, embedder_factory=self.embedder_factory)
+
+        if "live_dialog" in names:
+            self.services["live_dialog"] = VeraLiveDialogService(
+                config, logger, self._get_models_ids('LIVE_DIALOG_MODELS'),
+                embedder_factory=self.embedder_factory)
+
+        if "sentiment" in names:
+            self.services["sentiment"] = self._create_sentiment_service()
+
+    def _get_models_ids(self, option):
+        models_ids = self.config.get('host', option, fallback='')
+        return [int(model_id) for model_id in models_ids.split(',') if model_id.strip()]
+
+    def _create_sentiment_service(self):
+        # torch is needed by sentiment model only
+        from .sentiment_model import load_sentiment_model
+
+        section = 'sentiment-service'
+        model = load_sentiment_model(
+            self.config.get(section, 'MODEL_PATH'),
+            self.config.get(section, 'NEURAL_PATH'),
+            quantize=self.config.getboolean(section, 'QUANTIZE', fallback=False),
+        )
+
+        return SentimentService(
+            self.logger, model,
+            batching=self.config.getboolean(section, 'BATCHING', fallback=True),
+            max_batch_size=self.config.getint(section, 'MAX_BATCH_SIZE', fallback=32),
+            max_batch_wait_ms=self.config.getfloat(section, 'MAX_BATCH_WAIT_MS', fallback=5),
+        )
+
+    def create_app(self):
+        self.logger.info("Started Service Host with services: {}".format(
+            ", ".join(self.services)))
+
+        app = Flask(__name__)
+
+        @app.route("/services", methods=["GET", "POST"])
+        @as_json
+        def services():
+            return {
+                "services": list(self.services),
+                "embedders": (self.embedder_factory.stats()
+                              if self.embedder_factory is not None else {}),
+            }
+
+        FlaskJSON(app)
+
+        return DispatcherMiddleware(app, {
+            "/{}".format(name): service.create_flask_app()
+            for name, service in self.services.items()
+        })
+
+    def run(self, port):
+        run_simple("0.0.0.0", port, self.create_app(), threaded=True)
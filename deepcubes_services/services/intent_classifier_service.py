@@ -1,27 +1,36 @@
 from flask import Flask, request
 from flask_json import FlaskJSON, as_json, JsonError
-import os
 import json
 
 from deepcubes.models import IntentClassifier
 from deepcubes.utils.functions import sorted_labels
+from .cache import add_prediction_cache_route
 from .embedders import EmbedderFactory
+from .metrics import create_service_metrics, instrument_app, label_request
+from .model_cache import StoredModels
+from .request_logging import log_request
 
 
 class IntentClassifierService(object):
 
-    def __init__(self, config, logger, models_ids=[]):
+    def __init__(self, config, logger, models_ids=[], embedder_factory=None):
         self.config = config
         self.logger = logger
         self.models_ids = models_ids
 
         self.model_storage = config.get('classifier-service', 'MODEL_STORAGE')
-        embedder_path = config.get('classifier-service', 'EMBEDDER_PATH')
-        self.embedder_factory = EmbedderFactory(embedder_path)
+        if embedder_factory is None:
+            embedder_factory = EmbedderFactory.from_config(config, 'classifier-service')
+        self.embedder_factory = embedder_factory
 
-        self.models = dict()
-        for model_id in models_ids:
-            self.models[model_id] = self.load_model(model_id)
+        self.metrics = create_service_metrics()
+        self.stored_models = StoredModels(config, 'classifier-service', IntentClassifier,
+                                          self.embedder_factory, logger, self.metrics,
+                                          pinned=models_ids)
+        self.models = self.stored_models.models
+        self.prediction_cache = self.stored_models.prediction_cache
+
+        self.stored_models.preload(models_ids)
 
     def create_flask_app(self):
         self.logger.info("Started Intent Classifier Server...")
@@ -37,50 +46,86 @@ class IntentClassifierService(object):
             try:
                 model_id = int(data["model_id"])
                 query = data["query"]
+                top_k = self._get_top_k(data)
 
-                self.logger.info("Received {} request from {}".format(
-                    request.method, request.remote_addr))
-                self.logger.info("Received model id: {}".format(model_id))
+                model_answer = self.predict(model_id, [query])[0]
+                label_request(model_id=model_id)
+                output = self._format_answer(model_answer, top_k)
 
-                if model_id in self.models:
-                    model = self.models[model_id]
-                else:
-                    model = self.load_model(model_id)
-                    self.models[model_id] = model
+                log_request(self.logger, "predict", method=request.method,
+                            remote_addr=request.remote_addr, model_id=model_id, query=query,
+                            label=output[0]['answer'], probability=output[0]['probability'])
 
-                model_answer = sorted_labels(model([query]))[0]
-                output = [{
-                    "answer": label,
-                    "probability": probability,
-                    "threshold": 0.3,
-                    "accuracy_score": None
-                } for label, probability in model_answer]
+                return output
 
-                self.logger.info('Received query: {}'.format(query))
-                self.logger.info("Top predicted label: {}".format(output[0]['answer']))
-                self.logger.info("Max probability: {}".format(output[0]['probability']))
+            except Exception as e:
+                self.logger.error('error when handling HTTP request', exc_info=True)
+                raise JsonError(description=str(e), type=str(type(e).__name__))
 
-                return output
+        @app.route("/predict_batch", methods=["POST"])
+        @as_json
+        def predict_batch():
+            data = request.form if request.form else request.json
+
+            try:
+                model_id = int(data["model_id"])
+                queries = data["queries"]
+                top_k = self._get_top_k(data)
+
+                if isinstance(queries, str):
+                    queries = json.loads(queries)
+
+                log_request(self.logger, "predict_batch", method=request.method,
+                            remote_addr=request.remote_addr, model_id=model_id,
+                            queries_count=len(queries))
+
+                model_answers = self.predict(model_id, queries)
+                label_request(model_id=model_id)
+                return [self._format_answer(model_answer, top_k)
+                        for model_answer in model_answers]
 
             except Exception as e:
                 self.logger.error('error when handling HTTP request', exc_info=True)
                 raise JsonError(description=str(e), type=str(type(e).__name__))
 
+        @app.route("/model_cache_stats", methods=["GET", "POST"])
+        @as_json
+        def model_cache_stats():
+            return self.models.stats()
+
+        add_prediction_cache_route(app, self.prediction_cache)
+        instrument_app(app, self.metrics)
         FlaskJSON(app)
         return app
 
-    def load_model(self, model_id):
-        self.logger.info("Loading intent model {} ...".format(model_id))
-        model_path = os.path.join(self.model_storage, "{}.cube".format(model_id))
+    @staticmethod
+    def _get_top_k(data):
+        top_k = data.get("top_k", None)
+        if top_k is None:
+            return None
+
+        top_k = int(top_k)
+        if top_k < 1:
+            raise ValueError("`top_k` must be positive, got {}".format(top_k))
+
+        return top_k
+
+    def _format_answer(self, model_answer, top_k=None):
+        if top_k is not None:
+            model_answer = model_answer[:top_k]
 
-        if not os.path.isfile(model_path):
-            raise ValueError("Model {} not found".format(model_id))
+        return [{
+            "answer": label,
+            "probability": probability,
+            "threshold": 0.3,
+            "accuracy_score": None
+        } for label, probability in model_answer]
 
-        with open(model_path, 'r') as data:
-            model_params = json.loads(data.read())
+    def predict(self, model_id, queries):
+        """Predict sorted labels of queries, cached if prediction cache is enabled"""
 
-        model = IntentClassifier.load(model_params, self.embedder_factory)
-        return model
+        return self.stored_models.predict(model_id, queries,
+                                          lambda model, queries: sorted_labels(model(queries)))
 
     def run(self, port):
         app = self.create_flask_app()
@@ -0,0 +1,239 @@
+import bisect
+import threading
+import time
+
+from flask import Response, g, request
+
+
+# seconds, from fast cached predictions to model loading
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Histogram(object):
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry(object):
+    """Counters, gauges and histograms rendered in Prometheus text format.
+
+    Recording takes one lock and a few dict operations. Values of other
+    components (e.g. caches stats) are read by collectors only when
+    metrics are rendered.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+
+        # name -> (type, help), (name, labels) -> value
+        self._descriptions = dict()
+        self._values = dict()
+        self._collectors = list()
+        self._lock = threading.Lock()
+
+    def describe(self, name, metric_type, description):
+        self._descriptions[name] = (metric_type, description)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(labels))
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = _Histogram(self.buckets)
+
+            histogram.counts[bisect.bisect_left(self.buckets, value)] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def add_collector(self, collector):
+        """`collector()` returns list of (name, labels, value) gauges"""
+
+        self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            values = [(key, self._copy(value)) for key, value in self._values.items()]
+
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                values.append(((name, tuple(labels)), value))
+
+        lines = list()
+        for name in sorted({name for (name, _), _ in values}):
+            metric_type, description = self._descriptions.get(name, ("gauge", name))
+            lines.append("# HELP {} {}".format(name, description))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+
+            for (_, labels), value in sorted(
+                    (item for item in values if item[0][0] == name),
+                    key=lambda item: item[0][1]):
+                if isinstance(value, _Histogram):
+                    lines.extend(self._render_histogram(name, labels, value))
+                else:
+                    lines.append("{}{} {}".format(name, _format_labels(labels), value))
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _copy(value):
+        if not isinstance(value, _Histogram):
+            return value
+
+        histogram = _Histogram(())
+        histogram.counts = list(value.counts)
+        histogram.sum, histogram.count = value.sum, value.count
+        return histogram
+
+    def _render_histogram(self, name, labels, histogram):
+        lines, cumulative = list(), 0
+        for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append("{}_bucket{} {}".format(
+                name, _format_labels(labels + (("le", str(bound)),)), cumulative))
+
+        lines.append("{}_sum{} {}".format(name, _format_labels(labels), histogram.sum))
+        lines.append("{}_count{} {}".format(name, _format_labels(labels), histogram.count))
+        return lines
+
+
+def _format_labels(labels):
+    if not len(labels):
+        return ""
+
+    return "{{{}}}".format(",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels))
+
+
+def create_service_metrics():
+    metrics = MetricsRegistry()
+    metrics.describe("requests_total", "counter", "HTTP requests by route and status")
+    metrics.describe("request_errors_total", "counter", "HTTP requests with error status")
+    metrics.describe("request_duration_seconds", "histogram", "HTTP request latency by route")
+    metrics.describe("model_request_duration_seconds", "histogram",
+                     "HTTP request latency by route and model id")
+    metrics.describe("embedder_request_duration_seconds", "histogram",
+                     "HTTP request latency by route and embedder name")
+    metrics.describe("requests_in_flight", "gauge", "HTTP requests being handled")
+    metrics.describe("model_load_seconds", "histogram", "Model loading time")
+    return metrics
+
+
+def add_model_cache_metrics(metrics, models):
+    """Collect model cache stats and loading times of `ModelCache`"""
+
+    models.add_load_listener(
+        lambda model_id, seconds: metrics.observe("model_load_seconds", (), seconds))
+
+    def collect():
+        return [("model_cache_{}".format(key), (), value)
+                for key, value in models.stats().items()]
+
+    metrics.add_collector(collect)
+
+
+def add_cache_metrics(metrics, name, get_stats, labels=()):
+    """Collect `get_stats()` dict (e.g. `LRUCache.stats`) as `<name>_<key>` gauges"""
+
+    def collect():
+        return [("{}_{}".format(name, key), labels, value)
+                for key, value in get_stats().items()
+                if isinstance(value, (int, float))]
+
+    metrics.add_collector(collect)
+
+
+def label_request(model_id=None, name=None):
+    """Label metrics of current request with model id or embedder name.
+
+    Handlers call it once the model or embedder is known to exist, so
+    label values are never taken from arbitrary request fields.
+    """
+
+    if model_id is not None:
+        g.metrics_model_id = str(model_id)
+    if name is not None:
+        g.metrics_name = name
+
+
+def instrument_app(app, metrics, max_label_values=100):
+    """Record requests of Flask app to metrics and serve them on `/metrics`.
+
+    Successful requests labeled by `label_request` are also recorded by
+    model id and embedder name, values above `max_label_values` distinct
+    ones of each label are recorded as `other`.
+    """
+
+    metrics.inc("requests_in_flight", (), 0)
+
+    label_values = {"model_id": set(), "name": set()}
+    label_values_lock = threading.Lock()
+
+    def get_label_value(label, value):
+        with label_values_lock:
+            values = label_values[label]
+            if value not in values:
+                if len(values) >= max_label_values:
+                    return "other"
+                values.add(value)
+
+        return value
+
+    @app.before_request
+    def start_request():
+        g.metrics_started_at = time.perf_counter()
+        metrics.inc("requests_in_flight")
+
+    @app.teardown_request
+    def finish_request(error=None):
+        started_at = g.pop("metrics_started_at", None)
+        model_id = g.pop("metrics_model_id", None)
+        name = g.pop("metrics_name", None)
+        if started_at is None:
+            return
+
+        metrics.inc("requests_in_flight", (), -1)
+
+        duration = time.perf_counter() - started_at
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        if route == "/metrics":
+            return
+
+        status = g.pop("metrics_status", 500 if error is not None else 200)
+        metrics.inc("requests_total", (("route", route), ("status", status)))
+        if status >= 400:
+            metrics.inc("request_errors_total", (("route", route),))
+
+        metrics.observe("request_duration_seconds", (("route", route),), duration)
+        if status >= 400:
+            return
+
+        if model_id is not None:
+            metrics.observe("model_request_duration_seconds", (
+                ("route", route), ("model_id", get_label_value("model_id", model_id))
+            ), duration)
+
+        if name is not None:
+            metrics.observe("embedder_request_duration_seconds", (
+                ("route", route), ("name", get_label_value("name", name))
+            ), duration)
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_route():
+        return Response(metrics.render(), mimetype=PROMETHEUS_MIMETYPE)
@@ -0,0 +1,370 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import PredictionCache
+from .metrics import add_cache_metrics, add_model_cache_metrics
+from .model_storage import load_model_params
+
+
+class _Loading(object):
+    """Model load in progress that concurrent requests wait for"""
+
+    def __init__(self):
+        self.model = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ModelCache(object):
+    """Thread-safe cache of loaded models with LRU or LFU eviction.
+
+    Missed models are loaded by `load_model(model_id)`. Cache is bounded
+    by models count and approximate bytes (`sizeof(model_id)`), 0 disables
+    the bound. Pinned models and the model being inserted are never
+    evicted. LFU use counts are halved every `lfu_decay` requests, so models
+    that were used much long ago are evicted too. Concurrent requests of
+    missed model wait for single load of it. Cached model is reloaded when
+    `version(model_id)` (e.g. model file stat) differs from loaded one, the
+    version is checked at most once per `version_interval` seconds.
+    """
+
+    LRU = "lru"
+    LFU = "lfu"
+
+    def __init__(self, load_model, max_models=0, max_bytes=0, policy=LRU,
+                 sizeof=None, pinned=(), version=None, lfu_decay=1000,
+                 version_interval=1.0):
+        if policy not in [self.LRU, self.LFU]:
+            raise ValueError("Unknown model cache policy `{}`".format(policy))
+
+        self.load_model = load_model
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.sizeof = sizeof
+        self.pinned = set(pinned)
+        self.version = version
+        self.lfu_decay = lfu_decay
+        self.version_interval = version_interval
+        self.listeners = list()
+        self.evict_listeners = list()
+        self.load_listeners = list()
+
+        # model_id -> [model, size, uses count, version, version checked at]
+        self._entries = OrderedDict()
+        self._evicted_ids = set()
+        self._loading = dict()
+        self._lock = threading.Lock()
+        self._uses_since_decay = 0
+
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    @classmethod
+    def from_config(cls, config, section, load_model, sizeof=None, pinned=(), version=None):
+        """Create cache from `MODEL_CACHE_*` options of service config section"""
+
+        return cls(
+            load_model,
+            max_models=config.getint(section, 'MODEL_CACHE_SIZE', fallback=0),
+            max_bytes=config.getint(section, 'MODEL_CACHE_BYTES', fallback=0),
+            policy=config.get(section, 'MODEL_CACHE_POLICY', fallback=cls.LRU),
+            sizeof=sizeof,
+            pinned=pinned,
+            version=version,
+            lfu_decay=config.getint(section, 'MODEL_CACHE_LFU_DECAY', fallback=1000),
+            version_interval=config.getfloat(section, 'MODEL_CACHE_VERSION_INTERVAL',
+                                             fallback=1.0),
+        )
+
+    def add_listener(self, listener):
+        """Call `listener(model_id)` every time model is loaded or replaced"""
+
+        self.listeners.append(listener)
+
+    def add_evict_listener(self, listener):
+        """Call `listener(model_id, model)` every time model is dropped from cache"""
+
+        self.evict_listeners.append(listener)
+
+    def add_load_listener(self, listener):
+        """Call `listener(model_id, seconds)` after every model load"""
+
+        self.load_listeners.append(listener)
+
+    def get(self, model_id):
+        with self._lock:
+            entry = self._get_checked_entry(model_id)
+            if entry is not None:
+                return self._hit(model_id, entry)
+
+        # file stat is done out of lock and only when checked version is outdated
+        version = self.version(model_id) if self.version is not None else None
+
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry is not None and entry[3] == version:
+                entry[4] = time.monotonic()
+                return self._hit(model_id, entry)
+
+            self.misses += 1
+
+            loading = self._loading.get(model_id)
+            is_loader = loading is None
+            if is_loader:
+                loading = self._loading[model_id] = _Loading()
+
+        if not is_loader:
+            loading.done.wait()
+            if loading.error is not None:
+                raise loading.error
+
+            return loading.model
+
+        try:
+            started_at = time.perf_counter()
+            loading.model = self.load_model(model_id)
+            for listener in self.load_listeners:
+                listener(model_id, time.perf_counter() - started_at)
+
+            self.put(model_id, loading.model)
+        except Exception as e:
+            loading.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._loading[model_id]
+            loading.done.set()
+
+        return loading.model
+
+    def preload(self, model_ids, max_workers=4):
+        """Load models in background threads, returns futures by model ids"""
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {model_id: executor.submit(self.get, model_id) for model_id in model_ids}
+        executor.shutdown(wait=False)
+
+        return futures
+
+    def put(self, model_id, model):
+        size = self.sizeof(model_id) if self.sizeof is not None else 0
+        version = self.version(model_id) if self.version is not None else None
+
+        dropped = list()
+        with self._lock:
+            if model_id in self._entries:
+                replaced_model, replaced_size = self._entries.pop(model_id)[:2]
+                self.bytes -= replaced_size
+                if replaced_model is not model:
+                    dropped.append((model_id, replaced_model))
+            elif model_id in self._evicted_ids:
+                self._evicted_ids.discard(model_id)
+                self.reloads += 1
+
+            self._entries[model_id] = [model, size, 1, version, time.monotonic()]
+            self.bytes += size
+            self._count_use()
+            dropped.extend(self._evict(model_id))
+
+        for listener in self.listeners:
+            listener(model_id)
+
+        for dropped_id, dropped_model in dropped:
+            for listener in self.evict_listeners:
+                listener(dropped_id, dropped_model)
+
+    def pin(self, model_id):
+        with self._lock:
+            self.pinned.add(model_id)
+
+    def _get_checked_entry(self, model_id):
+        entry = self._entries.get(model_id)
+        if entry is None:
+            return None
+
+        if self.version is None or time.monotonic() - entry[4] < self.version_interval:
+            return entry
+
+        return None
+
+    def _hit(self, model_id, entry):
+        entry[2] += 1
+        self._entries.move_to_end(model_id)
+        self._count_use()
+        self.hits += 1
+        return entry[0]
+
+    def _count_use(self):
+        if self.policy != self.LFU or not self.lfu_decay:
+            return
+
+        self._uses_since_decay += 1
+        if self._uses_since_decay >= self.lfu_decay:
+            self._uses_since_decay = 0
+            for entry in self._entries.values():
+                entry[2] //= 2
+
+    def _evict(self, inserted_id):
+        evicted = list()
+        while self._is_overflowed():
+            candidates = [model_id for model_id in self._entries
+                          if model_id not in self.pinned and model_id != inserted_id]
+            if not len(candidates):
+                break
+
+            if self.policy == self.LFU:
+                # min keeps the first of equal ones, that is least recently used
+                evicted_id = min(candidates, key=lambda model_id: self._entries[model_id][2])
+            else:
+                evicted_id = candidates[0]
+
+            evicted_model, evicted_size = self._entries.pop(evicted_id)[:2]
+            self.bytes -= evicted_size
+            self._evicted_ids.add(evicted_id)
+            self.evictions += 1
+            evicted.append((evicted_id, evicted_model))
+
+        return evicted
+
+    def _is_overflowed(self):
+        return ((self.max_models and len(self._entries) > self.max_models)
+                or (self.max_bytes and self.bytes > self.max_bytes))
+
+    def __contains__(self, model_id):
+        return model_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "models": len(self._entries),
+                "pinned": len(self.pinned),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+            }
+
+
+class StoredModels(object):
+    """Models of `<MODEL_STORAGE>/<model_id>.cube` files shared by model services.
+
+    Models are loaded by `model_class.load(params, lease)` into `ModelCache`
+    (`models`) and reloaded when their files change. Embedders leased by a
+    model are released when it is evicted. Predictions are cached by
+    `PredictionCache` (`prediction_cache`) when it is enabled in config.
+    """
+
+    def __init__(self, config, section, model_class, embedder_factory, logger, metrics,
+                 pinned=()):
+        self.model_class = model_class
+        self.model_storage = config.get(section, 'MODEL_STORAGE')
+        self.embedder_factory = embedder_factory
+        self.logger = logger
+        self.preload_workers = config.getint(section, 'PRELOAD_WORKERS', fallback=4)
+
+        self.models = ModelCache.from_config(config, section, self.load_model,
+                                             sizeof=self.get_model_size, pinned=pinned,
+                                             version=self.get_model_version)
+
+        # embedders of loaded models are released when models are evicted
+        self.embedder_leases = dict()
+        self.models.add_evict_listener(self._release_model_embedders)
+
+        self.prediction_cache = PredictionCache.from_config(config, section)
+        if self.prediction_cache is not None:
+            self.models.add_listener(self.prediction_cache.invalidate)
+
+        add_model_cache_metrics(metrics, self.models)
+        if self.prediction_cache is not None:
+            add_cache_metrics(metrics, "prediction_cache", self.prediction_cache.stats)
+
+    def preload(self, model_ids):
+        for model_id, future in self.models.preload(model_ids, self.preload_workers).items():
+            future.add_done_callback(self._get_preload_callback(model_id))
+
+    def put(self, model_id, model, lease):
+        """Insert trained model, `lease` of its embedders is released on eviction"""
+
+        self.embedder_leases[id(model)] = lease
+        self.models.put(model_id, model)
+
+    def predict(self, model_id, queries, predict, labels=None):
+        """Return `predict(model, queries)`, cached if prediction cache is enabled.
+
+        `labels` filter used by `predict` is a part of cache key.
+        """
+
+        if self.prediction_cache is not None:
+            generation, model = self.prediction_cache.get_model(model_id, self.models.get)
+        else:
+            model = self.models.get(model_id)
+        if not len(queries):
+            return []
+
+        def predict_queries(queries):
+            return predict(model, queries)
+
+        if self.prediction_cache is None:
+            return predict_queries(queries)
+
+        return self.prediction_cache.predict(model_id, generation, queries, predict_queries,
+                                             labels)
+
+    def get_model_path(self, model_id):
+        return os.path.join(self.model_storage, "{}.cube".format(model_id))
+
+    def get_model_size(self, model_id):
+        return os.path.getsize(self.get_model_path(model_id))
+
+    def get_model_version(self, model_id):
+        try:
+            stat = os.stat(self.get_model_path(model_id))
+        except FileNotFoundError:
+            return None
+
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def load_model(self, model_id):
+        self.logger.info("Loading model {} ...".format(model_id))
+        model_path = self.get_model_path(model_id)
+
+        if not os.path.isfile(model_path):
+            raise ValueError("Model {} not found".format(model_id))
+
+        model_params = load_model_params(model_path)
+
+        lease = self.embedder_factory.lease()
+        try:
+            model = self.model_class.load(model_params, lease)
+        except Exception:
+            lease.release()
+            raise
+
+        self.embedder_leases[id(model)] = lease
+        return model
+
+    def _release_model_embedders(self, model_id, model):
+        lease = self.embedder_leases.pop(id(model), None)
+        if lease is not None:
+            lease.release()
+
+    def _get_preload_callback(self, model_id):
+        def callback(future):
+            if future.exception() is not None:
+                self.logger.error("Failed to preload model {}".format(model_id),
+                                  exc_info=future.exception())
+            else:
+                self.logger.info("Preloaded model {}".format(model_id))
+
+        return callback
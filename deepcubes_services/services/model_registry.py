@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from .model_storage import FORMAT_VERSION, get_model_format
+
+
+REGISTRY_FILE_NAME = "models.sqlite3"
+
+STATUS_TRAINING = "training"
+STATUS_READY = "ready"
+
+COLUMNS = ["model_id", "status", "lang", "embedder_mode", "model_format",
+           "format_version", "size", "created_at"]
+
+
+class ModelRegistry(object):
+    """Index of models storage in sqlite database.
+
+    New model ids are allocated atomically, also between processes, so
+    concurrent trainings never get the same id. Registry stores models
+    metadata and answers listing queries without storage scans. Existing
+    `.cube` files are imported once when registry is created.
+    """
+
+    def __init__(self, model_storage, path=None):
+        if path is None:
+            path = os.path.join(model_storage, REGISTRY_FILE_NAME)
+
+        self.model_storage = model_storage
+        self.path = path
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.close()
+
+        with self._transaction() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS models ("
+                "model_id INTEGER PRIMARY KEY, status TEXT NOT NULL, lang TEXT, "
+                "embedder_mode TEXT, model_format TEXT, format_version INTEGER, "
+                "size INTEGER, created_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+            imported = connection.execute(
+                "SELECT value FROM meta WHERE key = 'imported'").fetchone()
+            if imported is None:
+                self._import_storage(connection)
+                connection.execute("INSERT INTO meta VALUES ('imported', '1')")
+
+    @classmethod
+    def from_config(cls, config, section):
+        model_storage = config.get(section, 'MODEL_STORAGE')
+        return cls(model_storage, config.get(section, 'MODEL_REGISTRY', fallback=None))
+
+    @contextmanager
+    def _transaction(self, write=True):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            # write lock is taken at start, so id allocation is atomic
+            connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield connection
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def _import_storage(self, connection):
+        for file_name in os.listdir(self.model_storage):
+            model_name, extension = os.path.splitext(file_name)
+            if extension != ".cube" or not model_name.isdigit():
+                continue
+
+            model_path = os.path.join(self.model_storage, file_name)
+            stat = os.stat(model_path)
+            connection.execute(
+                "INSERT OR IGNORE INTO models (model_id, status, model_format, size, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (int(model_name), STATUS_READY, get_model_format(model_path),
+                 stat.st_size, stat.st_mtime)
+            )
+
+    def allocate(self, lang=None, embedder_mode=None, model_format=None):
+        """Reserve new model id for model in training"""
+
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT COALESCE(MAX(model_id) + 1, 0) FROM models").fetchone()
+            model_id = row[0]
+
+            # skip files saved around registry, e.g. by old scripts
+            while os.path.exists(self.get_model_path(model_id)):
+                model_id += 1
+
+            connection.execute(
+                "INSERT INTO models (model_id, status, lang, embedder_mode, model_format, "
+                "format_version, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model_id, STATUS_TRAINING, lang, embedder_mode, model_format,
+                 FORMAT_VERSION, time.time())
+            )
+
+        return model_id
+
+    def register(self, model_id, lang=None, embedder_mode=None):
+        """Mark saved model as ready, id may be allocated or chosen by caller"""
+
+        model_path = self.get_model_path(model_id)
+        model_format = get_model_format(model_path)
+        size = os.path.getsize(model_path)
+
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO models (model_id, status, created_at) "
+                "VALUES (?, ?, ?)", (int(model_id), STATUS_READY, time.time())
+            )
+            connection.execute(
+                "UPDATE models SET status = ?, model_format = ?, format_version = ?, "
+                "size = ?, lang = COALESCE(?, lang), "
+                "embedder_mode = COALESCE(?, embedder_mode) WHERE model_id = ?",
+                (STATUS_READY, model_format, FORMAT_VERSION, size, lang, embedder_mode,
+                 int(model_id))
+            )
+
+    def get_model_path(self, model_id):
+        return os.path.join(self.model_storage, "{}.cube".format(model_id))
+
+    def discard(self, model_id):
+        """Drop model id, e.g. when training failed"""
+
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM models WHERE model_id = ?", (int(model_id),))
+
+    def get(self, model_id):
+        with self._transaction(write=False) as connection:
+            row = connection.execute(
+                "SELECT {} FROM models WHERE model_id = ?".format(", ".join(COLUMNS)),
+                (int(model_id),)
+            ).fetchone()
+
+        return dict(zip(COLUMNS, row)) if row is not None else None
+
+    def list(self, lang=None, status=STATUS_READY, limit=None, offset=0):
+        query = "SELECT {} FROM models WHERE status = ?".format(", ".join(COLUMNS))
+        params = [status]
+
+        if lang is not None:
+            query += " AND lang = ?"
+            params.append(lang)
+
+        query += " ORDER BY model_id LIMIT ? OFFSET ?"
+        params.extend([limit if limit is not None else -1, offset])
+
+        with self._transaction(write=False) as connection:
+            rows = connection.execute(query, params).fetchall()
+
+        return [dict(zip(COLUMNS, row)) for row in rows]
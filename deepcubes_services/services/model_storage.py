@@ -0,0 +1,221 @@
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from .utils import write_atomically
+
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+MODEL_FORMATS = [FORMAT_JSON, FORMAT_BINARY]
+
+# binary container: magic, format version and header length, JSON header,
+# then raw arrays, every one aligned to ALIGNMENT bytes
+MAGIC = b"CUBEBIN\0"
+PREAMBLE = struct.Struct("<8sII")
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+
+# float lists smaller than this are kept in JSON header
+MIN_ARRAY_SIZE = 16
+ARRAY_KEY = "__array__"
+# params keys equal to ARRAY_KEY or starting with ESCAPE are prefixed with ESCAPE
+# (since format version 2), so params dicts are never read as array references
+ESCAPE = "~"
+
+
+def save_model_params(path, params, model_format=FORMAT_JSON):
+    """Atomically write model params in JSON or binary format"""
+
+    write_atomically(path, dump_model_params(params, model_format))
+
+
+def dump_model_params(params, model_format=FORMAT_JSON):
+    """Return bytes of model params in JSON or binary format"""
+
+    if model_format == FORMAT_JSON:
+        return json.dumps(params).encode("utf-8")
+    elif model_format == FORMAT_BINARY:
+        return _dump_binary(params)
+
+    raise ValueError("Unknown model format `{}`".format(model_format))
+
+
+def load_model_params(path, arrays=False):
+    """Read model params of any format.
+
+    Arrays of binary format are returned as lists, as models `load` expects
+    JSON params. With `arrays=True` they are returned as read-only
+    memory-mapped numpy arrays instead.
+    """
+
+    with open(path, "rb") as model_file:
+        magic = model_file.read(len(MAGIC))
+
+        if magic != MAGIC:
+            model_file.seek(0)
+            return json.loads(model_file.read().decode("utf-8"))
+
+        buffer = mmap.mmap(model_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return _load_binary(buffer, arrays)
+
+
+def get_model_format(path):
+    with open(path, "rb") as model_file:
+        if model_file.read(len(MAGIC)) == MAGIC:
+            return FORMAT_BINARY
+
+    return FORMAT_JSON
+
+
+def convert_model_file(path, model_format=FORMAT_BINARY):
+    """Rewrite model file in given format, returns False if already in it"""
+
+    if get_model_format(path) == model_format:
+        return False
+
+    params = load_model_params(path)
+    save_model_params(path, _to_json_types(params), model_format)
+    return True
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _escape_key(key):
+    if isinstance(key, str) and (key == ARRAY_KEY or key.startswith(ESCAPE)):
+        return ESCAPE + key
+
+    return key
+
+
+def _unescape_key(key):
+    return key[len(ESCAPE):] if key.startswith(ESCAPE) else key
+
+
+def _is_float_matrix(value):
+    """True for non-empty list of floats or of equal length lists of floats"""
+
+    if not len(value):
+        return False
+
+    if all(isinstance(item, float) for item in value):
+        return True
+
+    if not all(isinstance(item, list) and len(item) == len(value[0]) for item in value):
+        return False
+
+    return len(value[0]) > 0 and all(isinstance(number, float)
+                                     for item in value for number in item)
+
+
+def _row_size(value):
+    return len(value[0]) if isinstance(value[0], list) else 1
+
+
+def _extract_arrays(value, arrays):
+    """Replace big float lists by references to arrays list"""
+
+    if isinstance(value, dict):
+        return {_escape_key(key): _extract_arrays(item, arrays)
+                for key, item in value.items()}
+
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind != "f":
+            return _extract_arrays(value.tolist(), arrays)
+        array = value
+    elif isinstance(value, list):
+        # mixed lists (e.g. ints and floats) are kept as is to restore them exactly
+        if not _is_float_matrix(value) or len(value) * _row_size(value) < MIN_ARRAY_SIZE:
+            return [_extract_arrays(item, arrays) for item in value]
+
+        array = np.asarray(value, dtype=np.float64)
+    else:
+        return value
+
+    arrays.append(np.ascontiguousarray(array))
+    return {ARRAY_KEY: len(arrays) - 1}
+
+
+def _restore_arrays(value, arrays, unescape):
+    if isinstance(value, dict):
+        if ARRAY_KEY in value and len(value) == 1:
+            return arrays[value[ARRAY_KEY]]
+
+        get_key = _unescape_key if unescape else str
+        return {get_key(key): _restore_arrays(item, arrays, unescape)
+                for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [_restore_arrays(item, arrays, unescape) for item in value]
+
+    return value
+
+
+def _to_json_types(value):
+    if isinstance(value, dict):
+        return {key: _to_json_types(item) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [_to_json_types(item) for item in value]
+
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+
+    return value
+
+
+def _dump_binary(params):
+    arrays = list()
+    header_params = _extract_arrays(params, arrays)
+
+    # offsets are relative to the data section start
+    arrays_meta, offset = list(), 0
+    for array in arrays:
+        offset = _align(offset)
+        arrays_meta.append({
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        })
+        offset += array.nbytes
+
+    header = json.dumps({
+        "params": header_params,
+        "arrays": arrays_meta,
+    }).encode("utf-8")
+
+    data_start = _align(PREAMBLE.size + len(header))
+    output = bytearray(data_start + offset)
+    output[:PREAMBLE.size] = PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header))
+    output[PREAMBLE.size:PREAMBLE.size + len(header)] = header
+
+    for array, meta in zip(arrays, arrays_meta):
+        start = data_start + meta["offset"]
+        output[start:start + array.nbytes] = array.tobytes()
+
+    return bytes(output)
+
+
+def _load_binary(buffer, as_arrays=False):
+    _, version, header_size = PREAMBLE.unpack_from(buffer)
+    if version > FORMAT_VERSION:
+        raise ValueError("Unsupported binary model format version {}".format(version))
+
+    header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_size]).decode("utf-8"))
+    data_start = _align(PREAMBLE.size + header_size)
+
+    arrays = list()
+    for meta in header["arrays"]:
+        dtype = np.dtype(meta["dtype"])
+        count = int(np.prod(meta["shape"]))
+        array = np.frombuffer(buffer, dtype=dtype, count=count,
+                              offset=data_start + meta["offset"])
+        array = array.reshape(meta["shape"])
+        arrays.append(array if as_arrays else array.tolist())
+
+    return _restore_arrays(header["params"], arrays, unescape=version >= 2)
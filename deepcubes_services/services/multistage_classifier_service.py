@@ -1,31 +1,79 @@
-import os
 import json
+import os
+import threading
+from contextlib import contextmanager
 
 from flask import Flask, request
 from flask_json import FlaskJSON, as_json, JsonError
 
 from deepcubes.models import IntentClassifier, MultistageIntentClassifier
 
-from .embedders import EmbedderFactory
+from .embedders import EmbedderFactory, SharedQueriesFactory
+from .metrics import create_service_metrics, instrument_app
+from .model_storage import load_model_params
+from .request_logging import log_request
+from .snapshot import get_files_fingerprint, load_snapshot, save_snapshot
+
+
+class RecordedModel(object):
+    """Model proxy which records its outputs by query inside `record` scope
+    of current thread, other attributes are taken from the model"""
+
+    def __init__(self, model):
+        self.model = model
+        self._local = threading.local()
+
+    def __call__(self, queries, *args, **kwargs):
+        outputs = self.model(queries, *args, **kwargs)
+
+        recorded = getattr(self._local, 'outputs', None)
+        if recorded is not None:
+            recorded.update(zip(queries, outputs))
+
+        return outputs
+
+    def __getattr__(self, name):
+        if name == 'model':
+            raise AttributeError(name)
+
+        return getattr(self.model, name)
+
+    @contextmanager
+    def record(self):
+        self._local.outputs = dict()
+        try:
+            yield self._local.outputs
+        finally:
+            self._local.outputs = None
 
 
 class MultistageClassifierService(object):
 
-    def __init__(self, config, logger):
+    def __init__(self, config, logger, embedder_factory=None):
         self.config = config
         self.logger = logger
 
         self.model_storage = config.get('multistage-classifier-service',
                                         'MODEL_STORAGE')
-        embedder_path = config.get('multistage-classifier-service',
-                                   'EMBEDDER_PATH')
-        self.embedder_factory = EmbedderFactory(embedder_path)
+        if embedder_factory is None:
+            embedder_factory = EmbedderFactory.from_config(config,
+                                                           'multistage-classifier-service')
+        self.embedder_factory = embedder_factory
+        self.metrics = create_service_metrics()
+
+        # stages with the same embedder mode embed query once per request
+        self.shared_factory = SharedQueriesFactory(self.embedder_factory)
         major_model_id = config.get('multistage-classifier-service',
                                     'MAJOR_MODEL_ID')
         minor_model_id = config.get('multistage-classifier-service',
                                     'MINOR_MODEL_ID')
         groups_data_path = config.get('multistage-classifier-service',
                                       'GROUPS_DATA_PATH')
+        self.snapshot_path = config.get(
+            'multistage-classifier-service', 'SNAPSHOT_PATH',
+            fallback=os.path.join(self.model_storage, "multistage_{}_{}.snapshot".format(
+                major_model_id, minor_model_id))
+        )
         self.multistage_model = self.load_model(major_model_id, minor_model_id,
                                                 groups_data_path)
 
@@ -41,23 +89,13 @@ class MultistageClassifierService(object):
             data = request.form if request.form else request.json
 
             try:
-                self.logger.info("Received {} request from {}".format(
-                    request.method, request.remote_addr)
-                )
                 query = data["query"]
 
-                model_answer = self.multistage_model([query])
-
-                output = [{
-                    "answer": label,
-                    "probability": None,
-                    "threshold": 0.3,
-                    "accuracy_score": None
-                } for label in model_answer]
+                output = self.predict([query])
 
-                self.logger.info('Received query: {}'.format(query))
-                self.logger.info("Top predicted label: {}".format(output[0]['answer']))
-                self.logger.info("Max probability: {}".format(output[0]['probability']))
+                log_request(self.logger, "predict", method=request.method,
+                            remote_addr=request.remote_addr, query=query,
+                            label=output[0]['answer'], probability=output[0]['probability'])
 
                 return output
 
@@ -65,9 +103,59 @@ class MultistageClassifierService(object):
                 self.logger.error('error when handling HTTP request', exc_info=True)
                 raise JsonError(description=str(e), type=str(type(e).__name__))
 
+        @app.route("/predict_batch", methods=["POST"])
+        @as_json
+        def predict_batch():
+            data = request.form if request.form else request.json
+
+            try:
+                queries = data["queries"]
+                if isinstance(queries, str):
+                    queries = json.loads(queries)
+
+                log_request(self.logger, "predict_batch", method=request.method,
+                            remote_addr=request.remote_addr, queries_count=len(queries))
+
+                if not len(queries):
+                    return []
+
+                return self.predict(queries)
+
+            except Exception as e:
+                self.logger.error('error when handling HTTP request', exc_info=True)
+                raise JsonError(description=str(e), type=str(type(e).__name__))
+
+        instrument_app(app, self.metrics)
         FlaskJSON(app)
         return app
 
+    def predict(self, queries):
+        """Predict labels with probabilities, every query is embedded once.
+
+        Probability of label is taken from outputs of stages recorded during
+        multistage prediction: minor model one if it classified the query,
+        otherwise major model one.
+        """
+
+        with self.shared_factory.scope(), self.minor_model.record() as minor_outputs, \
+                self.major_model.record() as major_outputs:
+            labels = self.multistage_model(queries)
+
+        output = list()
+        for query, label in zip(queries, labels):
+            probability = minor_outputs.get(query, dict()).get(label)
+            if probability is None:
+                probability = major_outputs.get(query, dict()).get(label)
+
+            output.append({
+                "answer": label,
+                "probability": float(probability) if probability is not None else None,
+                "threshold": 0.3,
+                "accuracy_score": None
+            })
+
+        return output
+
     def load_model(self, major_model_id, minor_model_id, groups_data_path):
         self.logger.info("Loading major model {} ...".format(major_model_id))
 
@@ -78,11 +166,10 @@ class MultistageClassifierService(object):
         if not os.path.isfile(major_model_path):
             raise ValueError("Model {} not found".format(major_model_id))
 
-        with open(major_model_path, 'r') as data:
-            major_model_params = json.loads(data.read())
+        major_model_params = load_model_params(major_model_path)
 
-        major_model = IntentClassifier.load(major_model_params,
-                                            self.embedder_factory)
+        major_model = RecordedModel(IntentClassifier.load(major_model_params,
+                                                          self.shared_factory))
         self.logger.info("Loading minor model {} ...".format(minor_model_id))
 
         minor_model_path = os.path.join(
@@ -92,17 +179,55 @@ class MultistageClassifierService(object):
         if not os.path.isfile(minor_model_path):
             raise ValueError("Model {} not found".format(minor_model_id))
 
-        with open(minor_model_path, 'r') as data:
-            minor_model_params = json.loads(data.read())
+        minor_model_params = load_model_params(minor_model_path)
+
+        minor_model = RecordedModel(IntentClassifier.load(minor_model_params,
+                                                          self.shared_factory))
+        self.major_model, self.minor_model = major_model, minor_model
+
+        fingerprint = get_files_fingerprint([major_model_path, minor_model_path,
+                                             groups_data_path])
+        shared = self._get_snapshot_shared(major_model, minor_model)
+        manifest = {"major_model_id": major_model_id, "minor_model_id": minor_model_id}
+
+        try:
+            multistage_model = load_snapshot(self.snapshot_path, fingerprint,
+                                             MultistageIntentClassifier, shared, manifest)
+        except Exception:
+            self.logger.warning("Failed to load multistage snapshot {}".format(
+                self.snapshot_path), exc_info=True)
+            multistage_model = None
 
-        minor_model = IntentClassifier.load(minor_model_params,
-                                            self.embedder_factory)
+        if multistage_model is not None:
+            self.logger.info("Loaded multistage snapshot {}".format(self.snapshot_path))
+            return multistage_model
 
+        self.logger.info("Training multistage model ...")
         multistage_model = MultistageIntentClassifier(major_model, minor_model)
         multistage_model.train(groups_data_path)
 
+        try:
+            save_snapshot(self.snapshot_path, fingerprint, multistage_model,
+                          self._get_snapshot_shared(major_model, minor_model), manifest)
+            self.logger.info("Saved multistage snapshot {}".format(self.snapshot_path))
+        except Exception:
+            self.logger.warning("Failed to save multistage snapshot {}".format(
+                self.snapshot_path), exc_info=True)
+
         return multistage_model
 
+    def _get_snapshot_shared(self, major_model, minor_model):
+        """Objects stored by reference in snapshot: loaded models and embedders"""
+
+        shared = {
+            "embedder:{}".format(name): embedder
+            for name, embedder in self.shared_factory.embedders().items()
+        }
+        shared["major_model"] = major_model
+        shared["minor_model"] = minor_model
+
+        return shared
+
     def run(self, port):
         app = self.create_flask_app()
         app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,148 @@
+import atexit
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+
+LOG_FORMAT = '%(asctime)s | %(levelname)s | %(message)s'
+
+
+class RequestLog(object):
+    """Fields of one handled request, rendered as `key=value` pairs.
+
+    Rendering is done by `__str__`, i.e. only when record is formatted by
+    the handler (in the listener thread of `setup_logging`).
+    """
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join("{}={!r}".format(key, value) for key, value in self.fields.items())
+
+
+def log_request(logger, route, **fields):
+    """Log one structured INFO record per request, sampled by `RequestSampler`"""
+
+    if not logger.isEnabledFor(logging.INFO):
+        return
+
+    logger.info("%s %s", route, RequestLog(fields),
+                extra={"route": route, "request_log": fields})
+
+
+class RequestSampler(logging.Filter):
+    """Keeps `sample_rate` part of request records, other records are kept"""
+
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if getattr(record, "request_log", None) is None or record.levelno > logging.INFO:
+            return True
+
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Puts records to bounded queue without formatting.
+
+    INFO and lower records are dropped when queue is full, WARNING and
+    higher ones wait up to `block_timeout` seconds for free place. Count
+    of dropped records is logged as WARNING record once queue has place.
+    """
+
+    def __init__(self, records_queue, block_timeout=1.0, logger_name=__name__):
+        super().__init__(records_queue)
+        self.block_timeout = block_timeout
+        self.logger_name = logger_name
+        self.dropped = 0
+        self.reported = 0
+
+    def prepare(self, record):
+        # records are consumed in-process, so message and traceback are
+        # formatted later by the listener handlers
+        return record
+
+    def enqueue(self, record):
+        # called under handler lock, so counters are updated by one thread
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        self.report_dropped()
+
+    def report_dropped(self):
+        if self.dropped == self.reported:
+            return
+
+        record = logging.makeLogRecord({
+            "name": self.logger_name, "levelno": logging.WARNING, "levelname": "WARNING",
+            "msg": "%d log records were dropped, log queue was full",
+            "args": (self.dropped - self.reported,),
+        })
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            return
+
+        self.reported = self.dropped
+
+
+class _QueueListener(QueueListener):
+
+    def enqueue_sentinel(self):
+        # waits for free place in full queue
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(name, path, sample_rate=1.0, queue_size=10000, log_format=LOG_FORMAT):
+    """Create logger writing to file `path` from background thread.
+
+    Request threads only put records to queue, file writing and formatting
+    are done by `QueueListener`, which is stopped (and flushed) at exit.
+    Processes which exit without `atexit` handlers (e.g. `multiprocessing`
+    workers) call `stop_logging` themselves.
+    """
+
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+
+    file_handler = logging.FileHandler(path)
+    file_handler.setFormatter(logging.Formatter(log_format))
+
+    records_queue = queue.Queue(queue_size)
+    handler = NonBlockingQueueHandler(records_queue, logger_name=name)
+    handler.addFilter(RequestSampler(sample_rate))
+    logger.addHandler(handler)
+
+    listener = _QueueListener(records_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    handler.listener = listener
+    atexit.register(stop_logging, logger)
+
+    return logger
+
+
+def stop_logging(logger):
+    """Write queued records of `setup_logging` logger and stop its listener"""
+
+    for handler in logger.handlers:
+        listener = getattr(handler, "listener", None)
+        if listener is not None:
+            with handler.lock:
+                handler.report_dropped()
+            listener.stop()
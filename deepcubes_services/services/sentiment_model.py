@@ -0,0 +1,91 @@
+import contextlib
+import json
+import time
+
+import numpy as np
+
+
+# positive probability above it means positive label
+POSITIVE_THRESHOLD = 0.5
+
+
+def load_sentiment_model(model_path, neural_path, quantize=False):
+    from deepcubes.models.sentiment import Sentiment
+
+    with open(model_path, "r") as infile:
+        model_params = json.load(infile)
+
+    model = Sentiment.load(model_params, neural_path)
+
+    if quantize:
+        quantize_model(model)
+
+    return model
+
+
+def quantize_model(model):
+    """Replace torch modules of model by dynamically int8 quantized ones.
+
+    Linear and recurrent layers weights are stored in int8 and activations
+    are quantized on the fly, which speeds up CPU inference. Returns names
+    of quantized model attributes.
+    """
+
+    import torch
+
+    quantized = list()
+    for name, value in vars(model).items():
+        if isinstance(value, torch.nn.Module):
+            value.eval()
+            setattr(model, name, torch.quantization.quantize_dynamic(
+                value, {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU}, dtype=torch.qint8))
+            quantized.append(name)
+
+    if not len(quantized):
+        raise ValueError("Model has no torch modules to quantize")
+
+    return quantized
+
+
+def _no_grad():
+    try:
+        import torch
+    except ImportError:
+        return contextlib.nullcontext()
+
+    return torch.no_grad()
+
+
+def compare_models(reference_model, model, queries, batch_size=32, tolerance=None):
+    """Compare positive probabilities of two sentiment models (any callables).
+
+    Returns max absolute difference of outputs, `agreement` share of queries
+    with the same label, timings of both models and `passed` flag, which is
+    False when the difference is above `tolerance`.
+    """
+
+    def predict(predict_model):
+        outputs, started_at = list(), time.perf_counter()
+        with _no_grad():
+            for start in range(0, len(queries), batch_size):
+                outputs.extend(predict_model(queries[start:start + batch_size]))
+
+        return np.asarray(outputs, dtype=np.float64), time.perf_counter() - started_at
+
+    reference_outputs, reference_time = predict(reference_model)
+    outputs, model_time = predict(model)
+
+    if len(queries):
+        max_abs_diff = float(np.max(np.abs(reference_outputs - outputs)))
+        agreement = float(np.mean(
+            (reference_outputs > POSITIVE_THRESHOLD) == (outputs > POSITIVE_THRESHOLD)))
+    else:
+        max_abs_diff, agreement = 0.0, 1.0
+
+    return {
+        "max_abs_diff": max_abs_diff,
+        "agreement": agreement,
+        "passed": tolerance is None or max_abs_diff <= tolerance,
+        "reference_seconds": reference_time,
+        "seconds": model_time,
+    }
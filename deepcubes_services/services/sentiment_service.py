@@ -1,12 +1,42 @@
+import contextlib
+import json
+
 from flask import Flask, request
 from flask_json import FlaskJSON, as_json, JsonError
 
+from .batching import MicroBatcher
+from .metrics import create_service_metrics, instrument_app
+from .request_logging import log_request
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
 
 class SentimentService(object):
+    """Sentiment model service.
 
-    def __init__(self, logger, model):
+    With `batching` concurrent requests are merged into batches of up to
+    `max_batch_size` queries waiting at most `max_batch_wait_ms` for each
+    other, every batch is one forward pass of the model. Failed merged
+    batch is retried request by request, so only failed request gets the
+    error. Without `batching` larger requests are still split into
+    forward passes of up to `max_batch_size` queries.
+    """
+
+    def __init__(self, logger, model, batching=True, max_batch_size=32,
+                 max_batch_wait_ms=5):
         self.logger = logger
         self.model = model
+        self.metrics = create_service_metrics()
+        self.max_batch_size = max_batch_size
+
+        if batching:
+            self.predict = MicroBatcher(self.predict_batch, max_batch_size,
+                                        max_batch_wait_ms).submit
+        else:
+            self.predict = self.predict_chunks
 
     def create_flask_app(self):
         self.logger.info("Started Sentiment Server...")
@@ -23,21 +53,71 @@ class SentimentService(object):
                     query = data["query"]
                 else:
                     query = request.args.get("query")
+                check_queries([query])
+
+                positive_proba = self.predict([query])[0]
 
-                self.logger.info("Received {} `sentiment` request from {}".format(
-                    request.method, request.remote_addr
-                ))
+                log_request(self.logger, "sentiment", method=request.method,
+                            remote_addr=request.remote_addr, query=query,
+                            positive_proba=positive_proba)
 
-                positive_proba = float(self.model([query])[0])
                 return {'positive_proba': positive_proba}
 
             except Exception as e:
                 self.logger.error('error when handling HTTP request', exc_info=True)
                 raise JsonError(description=str(e), type=str(type(e).__name__))
 
+        @app.route("/sentiment_batch", methods=["POST"])
+        @as_json
+        def sentiment_batch():
+            data = request.form if request.form else request.json
+
+            try:
+                queries = data["queries"]
+                if isinstance(queries, str):
+                    queries = json.loads(queries)
+                check_queries(queries)
+
+                log_request(self.logger, "sentiment_batch", method=request.method,
+                            remote_addr=request.remote_addr, queries_count=len(queries))
+
+                return [{'positive_proba': positive_proba}
+                        for positive_proba in self.predict(queries)]
+
+            except Exception as e:
+                self.logger.error('error when handling HTTP request', exc_info=True)
+                raise JsonError(description=str(e), type=str(type(e).__name__))
+
+        instrument_app(app, self.metrics)
         FlaskJSON(app)
         return app
 
+    def predict_chunks(self, queries):
+        """Predict queries by forward passes of up to `max_batch_size` queries"""
+
+        output = list()
+        for start in range(0, len(queries), self.max_batch_size):
+            output.extend(self.predict_batch(queries[start:start + self.max_batch_size]))
+
+        return output
+
+    def predict_batch(self, queries):
+        if not len(queries):
+            return []
+
+        no_grad = torch.no_grad() if torch is not None else contextlib.nullcontext()
+        with no_grad:
+            return [float(positive_proba) for positive_proba in self.model(queries)]
+
     def run(self, port):
         app = self.create_flask_app()
         app.run(host="0.0.0.0", port=port, debug=False)
+
+
+def check_queries(queries):
+    if not isinstance(queries, list):
+        raise ValueError("`queries` must be a list of strings")
+
+    for query in queries:
+        if not isinstance(query, str):
+            raise ValueError("`query` field is required and must be a string")
@@ -0,0 +1,269 @@
+import bisect
+import hashlib
+import json
+
+import requests
+from flask import Flask, Response, request
+from flask_json import FlaskJSON, as_json, JsonError
+
+from .balancer import Balancer
+from .embedders import PooledSession
+from .metrics import create_service_metrics, instrument_app, label_request
+
+
+# routes with stats of worker's own caches, router returns them by worker
+WORKER_STATS_ROUTES = ["model_cache_stats", "prediction_cache_stats", "generic_bank_stats"]
+
+
+class HashRing(object):
+    """Consistent hash ring of nodes with virtual nodes.
+
+    Adding or removing one node moves only keys of its arcs, so other
+    nodes keep their caches.
+    """
+
+    def __init__(self, nodes, virtual_nodes=100):
+        if not len(nodes):
+            raise ValueError("Hash ring needs at least one node")
+
+        self.nodes = list(nodes)
+
+        points = sorted(
+            (self._hash("{}#{}".format(node, index)), node)
+            for node in self.nodes for index in range(virtual_nodes)
+        )
+        self._hashes = [point_hash for point_hash, _ in points]
+        self._points = [node for _, node in points]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(str(key).encode("utf-8")).hexdigest()[:16], 16)
+
+    def get_nodes(self, key, count=1):
+        """Return `count` distinct nodes clockwise from key hash"""
+
+        count = min(count, len(self.nodes))
+        start = bisect.bisect(self._hashes, self._hash(key))
+
+        nodes = list()
+        for index in range(len(self._points)):
+            node = self._points[(start + index) % len(self._points)]
+            if node not in nodes:
+                nodes.append(node)
+                if len(nodes) == count:
+                    break
+
+        return nodes
+
+
+class ShardRouter(object):
+    """Front router of model services, shards models between workers.
+
+    Requests with `model_id` are routed by consistent hash of model id to
+    `replicas` workers (`hot_replicas` for `hot_models`), so every worker
+    caches its shard of models only. Requests without `model_id` (e.g.
+    `/train`) are routed to any worker. Among replicas worker with least
+    outstanding requests is chosen, failed worker is replaced by next one.
+
+    Training job ids are prefixed with index of the worker which runs the
+    job, so `/train_status/<job_id>` is sent to that worker. Cache stats
+    routes are collected from all workers.
+    """
+
+    def __init__(self, logger, workers, replicas=1, hot_models=(), hot_replicas=None,
+                 virtual_nodes=100, session=None):
+        self.logger = logger
+        self.workers = list(workers)
+        self.replicas = replicas
+        self.hot_models = set(hot_models)
+        self.hot_replicas = hot_replicas if hot_replicas is not None else len(self.workers)
+
+        self.ring = HashRing(self.workers, virtual_nodes)
+        self.balancer = Balancer(self.workers)
+        self.session = session if session is not None else PooledSession(retries=0)
+        self.metrics = create_service_metrics()
+
+    @classmethod
+    def from_config(cls, config, logger, workers=None):
+        """Create router from `[shard-router]` config section"""
+
+        if workers is None:
+            workers = config.get('shard-router', 'WORKERS').split(',')
+
+        hot_models = config.get('shard-router', 'HOT_MODELS', fallback='')
+        hot_replicas = config.getint('shard-router', 'HOT_REPLICAS', fallback=0)
+
+        return cls(
+            logger,
+            [worker.strip() for worker in workers],
+            replicas=config.getint('shard-router', 'REPLICAS', fallback=1),
+            hot_models=[int(model_id) for model_id in hot_models.split(',') if model_id.strip()],
+            hot_replicas=hot_replicas or None,
+            virtual_nodes=config.getint('shard-router', 'VIRTUAL_NODES', fallback=100),
+            session=PooledSession(
+                pool_size=config.getint('shard-router', 'POOL_SIZE', fallback=10),
+                read_timeout=config.getfloat('shard-router', 'READ_TIMEOUT', fallback=600.0),
+                retries=0,
+            ),
+        )
+
+    def get_model_workers(self, model_id):
+        replicas = self.hot_replicas if model_id in self.hot_models else self.replicas
+        return self.ring.get_nodes(model_id, replicas)
+
+    def get_shard(self, worker, model_ids):
+        """Model ids owned by worker, e.g. to preload only them"""
+
+        return [model_id for model_id in model_ids
+                if worker in self.get_model_workers(model_id)]
+
+    def create_flask_app(self):
+        self.logger.info("Started Shard Router...")
+
+        self.logger.info("Prepare Flask app...")
+        app = Flask(__name__)
+
+        @app.route("/shard_stats", methods=["GET", "POST"])
+        @as_json
+        def shard_stats():
+            return self.balancer.stats()
+
+        @app.route("/<any({}):path>".format(", ".join(WORKER_STATS_ROUTES)),
+                   methods=["GET", "POST"])
+        @as_json
+        def workers_stats(path):
+            return self.collect_stats(path)
+
+        @app.route("/", defaults={"path": ""}, methods=["GET", "POST"])
+        @app.route("/<path:path>", methods=["GET", "POST"])
+        def route(path):
+            try:
+                return self.forward(path)
+
+            except Exception as e:
+                self.logger.error('error when handling HTTP request', exc_info=True)
+
+                # unavailable or slow worker is not an error of the request
+                if isinstance(e, requests.Timeout):
+                    status = 504
+                elif isinstance(e, requests.RequestException):
+                    status = 502
+                else:
+                    status = 400
+
+                raise JsonError(status, description=str(e), type=str(type(e).__name__))
+
+        instrument_app(app, self.metrics)
+        FlaskJSON(app)
+        return app
+
+    def collect_stats(self, path):
+        """Return `workers` dict with stats of every worker by worker url,
+        unavailable worker has `error` instead of stats"""
+
+        stats = dict()
+        for worker in self.workers:
+            try:
+                response = self.session.request("GET", "{}/{}".format(worker, path))
+                if response.status_code != 200:
+                    raise ValueError("Worker responded with status {}".format(
+                        response.status_code))
+
+                stats[worker] = json.loads(response.content.decode("utf-8"))
+            except (requests.RequestException, ValueError) as e:
+                self.logger.warning("Failed to get {} of worker {}".format(path, worker))
+                stats[worker] = {"error": "{}: {}".format(type(e).__name__, e)}
+
+        return {"workers": stats}
+
+    def forward(self, path):
+        model_id = self._get_model_id()
+        if path.startswith("train_status/"):
+            # job is known only to the worker which runs it
+            worker, job_id = self._get_job_worker(path[len("train_status/"):])
+            workers = candidates = [worker]
+            path = "train_status/{}".format(job_id)
+        elif model_id is not None:
+            workers = self.get_model_workers(model_id)
+            # replicas are tried first, then the next workers of the ring
+            candidates = self.ring.get_nodes(model_id, len(self.workers))
+        else:
+            workers = candidates = self.workers
+
+        kwargs = {"params": request.args}
+        if request.form:
+            kwargs["data"] = request.form
+        elif request.content_length:
+            kwargs["data"] = request.get_data()
+            kwargs["headers"] = {"Content-Type": request.content_type}
+
+        accept = request.headers.get("Accept")
+        if accept:
+            kwargs.setdefault("headers", dict())["Accept"] = accept
+
+        tried = list()
+        while True:
+            untried = [worker for worker in candidates if worker not in tried]
+            allowed = [worker for worker in untried if worker in workers] or untried[:1]
+
+            worker = self.balancer.acquire(exclude=set(self.workers) - set(allowed))
+            tried.append(worker)
+
+            # only not connected requests are sent to the next worker, others
+            # (e.g. timed out `/train`) may have been handled by the worker
+            failed = True
+            try:
+                response = self.session.request(request.method, "{}/{}".format(worker, path),
+                                                **kwargs)
+                failed = False
+            except requests.ConnectionError:
+                self.logger.warning("Worker {} is unavailable".format(worker))
+
+                if len(tried) >= len(candidates):
+                    raise
+                continue
+            finally:
+                self.balancer.release(worker, failed=failed)
+
+            if model_id is not None and response.status_code < 400:
+                label_request(model_id=model_id)
+
+            content = response.content
+            if path == "train" or path.startswith("train_status/"):
+                content = self._pin_job_id(worker, content)
+
+            return Response(content, status=response.status_code,
+                            content_type=response.headers.get("Content-Type"))
+
+    def _pin_job_id(self, worker, content):
+        """Prefix `job_id` of worker response with worker index"""
+
+        try:
+            data = json.loads(content.decode("utf-8"))
+        except ValueError:
+            return content
+
+        if not isinstance(data, dict) or data.get("job_id") is None:
+            return content
+
+        data["job_id"] = "{}-{}".format(self.workers.index(worker), data["job_id"])
+        return json.dumps(data).encode("utf-8")
+
+    def _get_job_worker(self, job_id):
+        index, separator, worker_job_id = job_id.partition("-")
+        if not separator or not index.isdigit() or int(index) >= len(self.workers):
+            raise KeyError("Training job {} not found".format(job_id))
+
+        return self.workers[int(index)], worker_job_id
+
+    def _get_model_id(self):
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = request.values
+
+        model_id = data.get("model_id", None)
+        return int(model_id) if model_id is not None else None
+
+    def run(self, port):
+        app = self.create_flask_app()
+        app.run(host="0.0.0.0", port=port, debug=False, threaded=True)
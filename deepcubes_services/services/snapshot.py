@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .utils import write_atomically
+
+
+SNAPSHOT_VERSION = 2
+
+
+def get_files_fingerprint(paths):
+    """Hash of files contents, changes when any of the files is changed"""
+
+    fingerprint = hashlib.sha256("snapshot-v{}".format(SNAPSHOT_VERSION).encode("utf-8"))
+    for path in paths:
+        fingerprint.update(os.path.basename(path).encode("utf-8"))
+
+        with open(path, "rb") as input_file:
+            for chunk in iter(lambda: input_file.read(1 << 20), b""):
+                fingerprint.update(chunk)
+
+    return fingerprint.hexdigest()
+
+
+def _get_class_name(cls):
+    return "{}.{}".format(cls.__module__, cls.__qualname__)
+
+
+def _encode(value, shared_names):
+    """Encode value to JSON types, every container is a single key dict"""
+
+    if id(value) in shared_names:
+        return {"shared": shared_names[id(value)]}
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {"value": value}
+
+    if isinstance(value, np.ndarray):
+        return {"ndarray": value.tolist(), "dtype": value.dtype.str}
+
+    if isinstance(value, np.generic):
+        return {"ndarray": value.item(), "dtype": value.dtype.str}
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        kind = type(value).__name__
+        return {kind: [_encode(item, shared_names) for item in value]}
+
+    if isinstance(value, dict):
+        return {"dict": [[_encode(key, shared_names), _encode(item, shared_names)]
+                         for key, item in value.items()]}
+
+    raise TypeError("`{}` object can't be stored in snapshot".format(type(value).__name__))
+
+
+_CONTAINERS = {"list": list, "tuple": tuple, "set": set, "frozenset": frozenset}
+
+
+def _decode(data, shared):
+    if "value" in data:
+        return data["value"]
+
+    if "shared" in data:
+        if data["shared"] not in shared:
+            raise ValueError("Unknown shared object `{}`".format(data["shared"]))
+        return shared[data["shared"]]
+
+    if "ndarray" in data:
+        # `[()]` turns 0-d array back into numpy scalar
+        return np.asarray(data["ndarray"], dtype=np.dtype(data["dtype"]))[()]
+
+    if "dict" in data:
+        return {_decode(key, shared): _decode(item, shared) for key, item in data["dict"]}
+
+    for kind, container in _CONTAINERS.items():
+        if kind in data:
+            return container(_decode(item, shared) for item in data[kind])
+
+    raise ValueError("Unknown snapshot value `{}`".format(list(data)))
+
+
+def save_snapshot(path, fingerprint, model, shared=None, manifest=None):
+    """Save trained `model` attributes as JSON manifest with fingerprint of inputs.
+
+    Objects from `shared` dict (e.g. loaded models and embedders) are
+    stored by name and must be passed to `load_snapshot` again. Other
+    attributes must be built of JSON types, containers and numpy arrays,
+    otherwise TypeError is raised and nothing is written. `manifest`
+    values (e.g. models ids) are stored and checked on load.
+    """
+
+    shared_names = {id(value): name for name, value in (shared or dict()).items()}
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "fingerprint": fingerprint,
+        "class": _get_class_name(type(model)),
+        "manifest": manifest or dict(),
+        "state": {name: _encode(value, shared_names) for name, value in vars(model).items()},
+    }
+
+    write_atomically(path, json.dumps(data).encode("utf-8"))
+
+
+def load_snapshot(path, fingerprint, cls, shared=None, manifest=None):
+    """Return `cls` model rebuilt from snapshot, None if snapshot is absent,
+    of other version, class, manifest or fingerprint"""
+
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        with open(path, "rb") as input_file:
+            data = json.loads(input_file.read().decode("utf-8"))
+    except ValueError:
+        # e.g. pickled snapshot of version 1
+        return None
+
+    if (not isinstance(data, dict)
+            or data.get("version") != SNAPSHOT_VERSION
+            or data.get("fingerprint") != fingerprint
+            or data.get("class") != _get_class_name(cls)
+            or data.get("manifest") != (manifest or dict())):
+        return None
+
+    # attributes are restored without calling constructor, as pickle does
+    model = cls.__new__(cls)
+    for name, value in data["state"].items():
+        setattr(model, name, _decode(value, shared or dict()))
+
+    return model
@@ -0,0 +1,127 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TrainingQueueFull(Exception):
+    pass
+
+
+class TrainingJob(object):
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = self.QUEUED
+        self.model_id = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "model_id": self.model_id,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class TrainingJobQueue(object):
+    """Runs `train(config)` in bounded thread pool, returns job ids.
+
+    At most `max_workers` models are trained concurrently and at most
+    `max_queued` jobs wait for a worker, `submit` raises
+    `TrainingQueueFull` above it. Only last `max_history` finished jobs
+    are kept for status requests.
+    """
+
+    def __init__(self, train, max_workers=1, max_queued=100, max_history=1000):
+        self.train = train
+        self.max_queued = max_queued
+        self.max_history = max_history
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, section, train):
+        """Create queue from `TRAIN_*` options, None if async training is disabled"""
+
+        if not config.getboolean(section, 'TRAIN_ASYNC', fallback=False):
+            return None
+
+        return cls(
+            train,
+            max_workers=config.getint(section, 'TRAIN_WORKERS', fallback=1),
+            max_queued=config.getint(section, 'TRAIN_QUEUE_SIZE', fallback=100),
+            max_history=config.getint(section, 'TRAIN_JOBS_HISTORY', fallback=1000),
+        )
+
+    def submit(self, config):
+        with self._lock:
+            queued = sum(job.status == TrainingJob.QUEUED for job in self.jobs.values())
+            if queued >= self.max_queued:
+                raise TrainingQueueFull(
+                    "Training queue is full, {} jobs are waiting".format(queued))
+
+            job = TrainingJob(uuid.uuid4().hex)
+            self.jobs[job.job_id] = job
+            self._trim_history()
+
+        self.executor.submit(self._run, job, config)
+        return job.job_id
+
+    def status(self, job_id):
+        with self._lock:
+            if job_id not in self.jobs:
+                raise KeyError("Training job {} not found".format(job_id))
+
+            return self.jobs[job_id].to_dict()
+
+    def _run(self, job, config):
+        with self._lock:
+            job.status = TrainingJob.RUNNING
+            job.started_at = time.time()
+
+        try:
+            model_id = self.train(config)
+        except Exception as e:
+            with self._lock:
+                job.status = TrainingJob.FAILED
+                job.error = "{}: {}".format(type(e).__name__, e)
+                job.finished_at = time.time()
+            return
+
+        with self._lock:
+            job.status = TrainingJob.DONE
+            job.model_id = model_id
+            job.finished_at = time.time()
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job.status in [TrainingJob.DONE, TrainingJob.FAILED]]
+
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self.jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self.jobs.values()]
+
+        return {
+            status: statuses.count(status)
+            for status in [TrainingJob.QUEUED, TrainingJob.RUNNING,
+                           TrainingJob.DONE, TrainingJob.FAILED]
+        }
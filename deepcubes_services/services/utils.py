@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 def get_new_model_id(path):
@@ -12,3 +13,37 @@ def get_new_model_id(path):
     new_model_id = sorted_ids[-1] + 1 if len(sorted_ids) else 0
 
     return new_model_id
+
+
+def normalize_query(query):
+    return " ".join(query.split())
+
+
+def write_atomically(path, data):
+    """Write bytes to temporary file and move it to path"""
+
+    write_files_atomically([(path, data)])
+
+
+def write_files_atomically(files):
+    """Write bytes of every `(path, data)` pair to temporary files and move
+    them to paths in the given order, nothing is moved if any write fails"""
+
+    tmp_paths = list()
+    try:
+        for path, data in files:
+            directory = os.path.dirname(path) or "."
+            os.makedirs(directory, exist_ok=True)
+
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+            tmp_paths.append(tmp_path)
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+
+        for (path, _), tmp_path in zip(files, tmp_paths):
+            os.replace(tmp_path, path)
+    except Exception:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
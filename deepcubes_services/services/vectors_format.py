@@ -0,0 +1,66 @@
+import io
+import struct
+
+import numpy as np
+
+
+JSON_MIMETYPE = "application/json"
+FLOAT32_MIMETYPE = "application/x-float32-vectors"
+NPY_MIMETYPE = "application/x-npy"
+
+FORMAT_TO_MIMETYPE = {
+    "json": JSON_MIMETYPE,
+    "float32": FLOAT32_MIMETYPE,
+    "npy": NPY_MIMETYPE,
+}
+
+# rows and dimension as little-endian uint32
+FLOAT32_HEADER = struct.Struct("<II")
+
+
+def get_response_format(data, accept_mimetypes):
+    """Choose vectors format by `format` field or by Accept header"""
+
+    if data.get("format"):
+        vectors_format = data["format"]
+        if vectors_format not in FORMAT_TO_MIMETYPE:
+            raise ValueError("Unknown vectors format `{}`".format(vectors_format))
+
+        return vectors_format
+
+    for vectors_format in ["float32", "npy"]:
+        if FORMAT_TO_MIMETYPE[vectors_format] in accept_mimetypes.values():
+            return vectors_format
+
+    return "json"
+
+
+def encode_vectors(vectors, vectors_format):
+    vectors = np.asarray(vectors, dtype="<f4")
+    if not len(vectors):
+        vectors = vectors.reshape(0, 0)
+
+    if vectors_format == "float32":
+        rows, dim = vectors.shape
+        return FLOAT32_HEADER.pack(rows, dim) + vectors.tobytes()
+
+    elif vectors_format == "npy":
+        output = io.BytesIO()
+        np.save(output, vectors)
+        return output.getvalue()
+
+    raise ValueError("`{}` is not binary vectors format".format(vectors_format))
+
+
+def decode_vectors(payload, mimetype):
+    """Decode binary vectors payload without copying it"""
+
+    if mimetype == FLOAT32_MIMETYPE:
+        rows, dim = FLOAT32_HEADER.unpack_from(payload)
+        return np.frombuffer(payload, dtype="<f4", count=rows * dim,
+                             offset=FLOAT32_HEADER.size).reshape(rows, dim)
+
+    elif mimetype == NPY_MIMETYPE:
+        return np.load(io.BytesIO(payload))
+
+    raise ValueError("`{}` is not binary vectors mimetype".format(mimetype))
@@ -1,31 +1,73 @@
+import copy
 import json
 import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from flask import Flask, request
 from flask_json import FlaskJSON, as_json, JsonError
+import numpy as np
 
 from deepcubes.models import VeraLiveDialog
 
-from .embedders import EmbedderFactory
-from .utils import get_new_model_id
+from .cache import add_prediction_cache_route
+from .embedders import EmbedderFactory, StoredQueriesEmbedder
+from .generic_bank import GenericBank
+from .metrics import create_service_metrics, instrument_app, label_request
+from .model_cache import StoredModels
+from .model_registry import ModelRegistry
+from .model_storage import FORMAT_BINARY, FORMAT_JSON, dump_model_params, load_model_params
+from .request_logging import log_request
+from .training_jobs import TrainingJobQueue
+from .utils import write_files_atomically
+
+
+LABEL_LIST_FIELDS = ['patterns', 'generics', 'intent_phrases']
 
 
 class VeraLiveDialogService(object):
 
-    def __init__(self, config, logger, models_ids=[]):
+    def __init__(self, config, logger, models_ids=[], embedder_factory=None):
         self.config = config
         self.logger = logger
 
         self.model_storage = config.get('live-dialog-service', 'MODEL_STORAGE')
         self.generic_data_path = config.get('live-dialog-service', 'GENERIC_DATA_PATH')
 
-        embedder_path = config.get('live-dialog-service', 'EMBEDDER_PATH')
-        self.embedder_factory = EmbedderFactory(embedder_path)
+        if embedder_factory is None:
+            embedder_factory = EmbedderFactory.from_config(config, 'live-dialog-service')
+        self.embedder_factory = embedder_factory
 
         self.lang_to_emb_mode = dict(config['embedder'])
-
-        self.models = dict()
-        for model_id in models_ids:
-            self.models[model_id] = self.load_model(model_id)
+        self.generic_bank = GenericBank(self.generic_data_path)
+        self.model_format = config.get('live-dialog-service', 'MODEL_FORMAT',
+                                       fallback=FORMAT_JSON)
+        # train data makes models updatable, but takes about as much space as models
+        self.save_train_data = config.getboolean('live-dialog-service', 'SAVE_TRAIN_DATA',
+                                                 fallback=False)
+
+        self.metrics = create_service_metrics()
+        self.stored_models = StoredModels(config, 'live-dialog-service', VeraLiveDialog,
+                                          self.embedder_factory, logger, self.metrics,
+                                          pinned=models_ids)
+        self.models = self.stored_models.models
+        self.prediction_cache = self.stored_models.prediction_cache
+
+        self.registry = ModelRegistry.from_config(config, 'live-dialog-service')
+
+        # updates of the same model are applied one by one, lock is kept
+        # only while some update of the model is waiting or running
+        self._update_locks = dict()
+        self._update_locks_lock = threading.Lock()
+        self.training_jobs = TrainingJobQueue.from_config(config, 'live-dialog-service',
+                                                          self._train_job)
+
+        # embedders of preloaded generic bank are kept for service lifetime
+        self.generic_bank_leases = dict()
+        if config.getboolean('live-dialog-service', 'GENERIC_BANK_PRELOAD', fallback=True):
+            self.preload_generic_bank()
+
+        self.stored_models.preload(models_ids)
 
     def create_flask_app(self):
         self.logger.info("Started Live Dialog Server...")
@@ -38,32 +80,21 @@ class VeraLiveDialogService(object):
         def predict():
             data = request.form if request.form else request.json
             try:
-                self.logger.info("Received {} `predict` request from {}".format(
-                    request.method, request.remote_addr
-                ))
-
                 model_id = int(data['model_id'])
                 query = data["query"]
                 labels = data.get("labels", None)
 
-                self.logger.info("Received model id: {}".format(model_id))
-
-                if model_id in self.models:
-                    model = self.models[model_id]
-                else:
-                    model = self.load_model(model_id)
-                    self.models[model_id] = model
-
-                model_answer = model([query], labels)[0]
+                model_answer = self.predict(model_id, [query], labels)[0]
+                label_request(model_id=model_id)
                 output = [{
                     "label": label,
                     "proba": probability
                 } for label, probability in model_answer]
 
-                self.logger.info('Received query: {}'.format(query))
-                self.logger.info('Received labels: {}'.format(labels))
-                self.logger.info("Top predicted label: {}".format(output[0]['label']))
-                self.logger.info("Max probability: {}".format(output[0]['proba']))
+                log_request(self.logger, "predict", method=request.method,
+                            remote_addr=request.remote_addr, model_id=model_id, query=query,
+                            labels=labels, label=output[0]['label'],
+                            probability=output[0]['proba'])
 
                 return output
 
@@ -83,51 +114,302 @@ class VeraLiveDialogService(object):
                 config = json.loads(data["config"])
                 self.logger.info("Received `lang` key: {}".format(config['lang']))
 
-                embedder_mode = self.lang_to_emb_mode[config['lang']]
-                embedder = self.embedder_factory.create(embedder_mode)
-                self.logger.info("Set embedder mode: {}".format(embedder_mode))
+                if self.training_jobs is not None:
+                    job_id = self.training_jobs.submit(config)
+                    self.logger.info("Queued training job {}".format(job_id))
 
-                live_dialog_model = VeraLiveDialog(embedder, self.generic_data_path)
-                live_dialog_model.train(config)
+                    return {
+                        "message": 'Queued training job {}'.format(job_id),
+                        "job_id": job_id,
+                    }
 
-                new_model_id = get_new_model_id(self.model_storage)
+                new_model_id = self.train_model(config)
 
-                clf_params = live_dialog_model.save()
-                clf_path = os.path.join(self.model_storage, '{}.cube'.format(new_model_id))
+                return {
+                    "message": 'Created model with model_id {}'.format(new_model_id),
+                    "model_id": new_model_id,
+                }
 
-                os.makedirs(self.model_storage, exist_ok=True)
-                with open(clf_path, 'w') as out:
-                    out.write(json.dumps(clf_params))
+            except Exception as e:
+                self.logger.error('error when handling HTTP request', exc_info=True)
+                raise JsonError(description=str(e), type=str(type(e).__name__))
 
-                self.models[new_model_id] = live_dialog_model
+        @app.route("/update", methods=["POST"])
+        @as_json
+        def update():
+            data = request.form if request.form else request.json
+            try:
+                self.logger.info("Received {} `update` request from {}".format(
+                    request.method, request.remote_addr
+                ))
 
-                self.logger.info('Saved model with model_id {}'.format(new_model_id))
+                model_id = int(data['model_id'])
+                update = data['update']
+                if isinstance(update, str):
+                    update = json.loads(update)
+
+                self.logger.info("Received model id: {}".format(model_id))
+
+                encoded_count = self.update_model(model_id, update)
+                label_request(model_id=model_id)
 
                 return {
-                    "message": 'Created model with model_id {}'.format(new_model_id),
-                    "model_id": new_model_id,
+                    "message": 'Updated model with model_id {}'.format(model_id),
+                    "model_id": model_id,
+                    "encoded_phrases": encoded_count,
                 }
 
             except Exception as e:
                 self.logger.error('error when handling HTTP request', exc_info=True)
                 raise JsonError(description=str(e), type=str(type(e).__name__))
 
+        @app.route("/train_status/<job_id>", methods=["GET", "POST"])
+        @as_json
+        def train_status(job_id):
+            try:
+                if self.training_jobs is None:
+                    raise ValueError("Async training is disabled")
+
+                return self.training_jobs.status(job_id)
+
+            except Exception as e:
+                self.logger.error('error when handling HTTP request', exc_info=True)
+                raise JsonError(description=str(e), type=str(type(e).__name__))
+
+        @app.route("/models", methods=["GET", "POST"])
+        @as_json
+        def models():
+            data = request.get_json(silent=True) or request.values
+            try:
+                limit = data.get("limit", None)
+
+                return self.registry.list(
+                    lang=data.get("lang", None),
+                    limit=int(limit) if limit is not None else None,
+                    offset=int(data.get("offset", 0)),
+                )
+
+            except Exception as e:
+                self.logger.error('error when handling HTTP request', exc_info=True)
+                raise JsonError(description=str(e), type=str(type(e).__name__))
+
+        @app.route("/model_cache_stats", methods=["GET", "POST"])
+        @as_json
+        def model_cache_stats():
+            return self.models.stats()
+
+        @app.route("/generic_bank_stats", methods=["GET", "POST"])
+        @as_json
+        def generic_bank_stats():
+            return self.generic_bank.stats()
+
+        add_prediction_cache_route(app, self.prediction_cache)
+        instrument_app(app, self.metrics)
         FlaskJSON(app)
         return app
 
-    def load_model(self, model_id):
-        self.logger.info("Loading intent model {} ...".format(model_id))
-        model_path = os.path.join(self.model_storage, "{}.cube".format(model_id))
+    def train_model(self, config):
+        embedder_mode = self.lang_to_emb_mode[config['lang']]
+
+        lease = self.embedder_factory.lease()
+        try:
+            live_dialog_model, vectors, _ = self._fit_model(config, lease)
+            if not self.save_train_data:
+                vectors = None
+
+            new_model_id = self.registry.allocate(config['lang'], embedder_mode,
+                                                  self.model_format)
+            try:
+                self._save_model(new_model_id, live_dialog_model, config, vectors)
+            except Exception:
+                self.registry.discard(new_model_id)
+                raise
+        except Exception:
+            lease.release()
+            raise
+
+        self.stored_models.put(new_model_id, live_dialog_model, lease)
+
+        self.logger.info('Saved model with model_id {}'.format(new_model_id))
+        return new_model_id
 
-        if not os.path.isfile(model_path):
-            raise ValueError("Model {} not found".format(model_id))
+    def update_model(self, model_id, update):
+        """Apply labels update to model config and retrain it under the same id.
 
-        with open(model_path, 'r') as data:
-            model_params = json.loads(data.read())
+        Only new phrases are embedded, vectors of the others are taken from
+        model train data. Returns number of embedded phrases.
+        """
 
-        model = VeraLiveDialog.load(model_params, self.embedder_factory)
-        return model
+        with self._update_lock(model_id):
+            train_data_path = self.get_train_data_path(model_id)
+            if not os.path.isfile(train_data_path):
+                raise ValueError("Model {} has no train data, train it again "
+                                 "to make it updatable".format(model_id))
+
+            train_data = load_model_params(train_data_path, arrays=True)
+            config = update_live_dialog_config(train_data['config'], update)
+            stored_vectors = dict(zip(train_data['queries'], train_data['vectors']))
+
+            lease = self.embedder_factory.lease()
+            try:
+                live_dialog_model, vectors, encoded_count = self._fit_model(
+                    config, lease, stored_vectors)
+                self._save_model(model_id, live_dialog_model, config, vectors)
+            except Exception:
+                lease.release()
+                raise
+
+            self.stored_models.put(model_id, live_dialog_model, lease)
+
+        self.logger.info('Updated model {}, embedded {} new phrases'.format(
+            model_id, encoded_count))
+        return encoded_count
+
+    @contextmanager
+    def _update_lock(self, model_id):
+        with self._update_locks_lock:
+            lock_users = self._update_locks.setdefault(model_id, [threading.Lock(), 0])
+            lock_users[1] += 1
+
+        try:
+            with lock_users[0]:
+                yield
+        finally:
+            with self._update_locks_lock:
+                lock_users[1] -= 1
+                if not lock_users[1]:
+                    del self._update_locks[model_id]
+
+    def _fit_model(self, config, lease, stored_vectors=None):
+        """Train model, returns it with vectors of its own (not generic)
+        phrases and count of embedded phrases"""
+
+        embedder_mode = self.lang_to_emb_mode[config['lang']]
+        base_embedder = lease.create(embedder_mode)
+        self.logger.info("Set embedder mode: {}".format(embedder_mode))
+
+        generic_vectors = self.generic_bank.get_vectors(base_embedder)
+        vectors = dict(generic_vectors)
+        vectors.update(stored_vectors or dict())
+
+        embedder = StoredQueriesEmbedder(base_embedder, vectors)
+        live_dialog_model = VeraLiveDialog(embedder, self.generic_data_path)
+        live_dialog_model.train(config)
+
+        encoded_count = embedder.encoded_count
+        vectors = {query: vector for query, vector in embedder.detach().items()
+                   if query not in generic_vectors}
+
+        return live_dialog_model, vectors, encoded_count
+
+    def preload_generic_bank(self):
+        """Embed generic phrases for every configured embedder mode.
+
+        Embedders stay leased, so the first trainings don't load them again.
+        """
+
+        for embedder_mode in set(self.lang_to_emb_mode.values()):
+            if embedder_mode in self.generic_bank_leases:
+                continue
+
+            lease = self.embedder_factory.lease()
+            try:
+                self.generic_bank.get_vectors(lease.create(embedder_mode))
+                self.logger.info("Embedded generic phrases for embedder mode {}".format(
+                    embedder_mode))
+            except Exception:
+                lease.release()
+                self.logger.warning("Failed to embed generic phrases for embedder mode {}".format(
+                    embedder_mode), exc_info=True)
+            else:
+                self.generic_bank_leases[embedder_mode] = lease
+
+    def _save_model(self, model_id, live_dialog_model, config, vectors=None):
+        """Save model with train data if `vectors` are given, otherwise
+        remove stale train data of the model id"""
+
+        files = list()
+        if vectors is not None:
+            queries = list(vectors)
+            files.append((self.get_train_data_path(model_id), dump_model_params({
+                "config": config,
+                "queries": queries,
+                "vectors": np.array([vectors[query] for query in queries], dtype=np.float32),
+            }, FORMAT_BINARY)))
+        elif os.path.isfile(self.get_train_data_path(model_id)):
+            os.remove(self.get_train_data_path(model_id))
+
+        # both files are written before any is moved, train data is moved first,
+        # so updates never start from train data older than the saved model
+        files.append((self.stored_models.get_model_path(model_id),
+                      dump_model_params(live_dialog_model.save(), self.model_format)))
+        write_files_atomically(files)
+        self.registry.register(model_id)
+
+    def _train_job(self, config):
+        try:
+            return self.train_model(config)
+        except Exception:
+            self.logger.error('error when training model in background', exc_info=True)
+            raise
+
+    def get_train_data_path(self, model_id):
+        return os.path.join(self.model_storage, "{}.train".format(model_id))
+
+    def predict(self, model_id, queries, labels=None):
+        """Predict sorted labels of queries, cached if prediction cache is enabled"""
+
+        return self.stored_models.predict(model_id, queries,
+                                          lambda model, queries: model(queries, labels), labels)
 
     def run(self, port):
         app = self.create_flask_app()
         app.run(host="0.0.0.0", port=port, debug=False)
+
+
+def update_live_dialog_config(config, update):
+    """Return copy of live dialog config with applied update.
+
+    `labels_settings` adds or replaces whole labels, `remove_labels` drops
+    labels, `add` and `remove` map label to `patterns`, `intent_phrases`
+    and `generics` lists that are added to or removed from the label.
+    """
+
+    config = copy.deepcopy(config)
+    labels_settings = OrderedDict(
+        (settings['label'], settings) for settings in config['labels_settings'])
+
+    for settings in update.get('labels_settings', []):
+        labels_settings[settings['label']] = settings
+
+    for label in update.get('remove_labels', []):
+        if label not in labels_settings:
+            raise ValueError("Label `{}` not found".format(label))
+        del labels_settings[label]
+
+    for label, fields in update.get('add', {}).items():
+        settings = labels_settings.setdefault(label, {'label': label})
+        for field, values in fields.items():
+            if field not in LABEL_LIST_FIELDS:
+                raise ValueError("Unknown label field `{}`".format(field))
+
+            current = settings.setdefault(field, [])
+            current.extend(value for value in values if value not in current)
+
+    for label, fields in update.get('remove', {}).items():
+        if label not in labels_settings:
+            raise ValueError("Label `{}` not found".format(label))
+
+        for field, values in fields.items():
+            if field not in LABEL_LIST_FIELDS:
+                raise ValueError("Unknown label field `{}`".format(field))
+
+            settings = labels_settings[label]
+            settings[field] = [value for value in settings.get(field, [])
+                               if value not in values]
+
+    if 'not_understand_label' in update:
+        config['not_understand_label'] = update['not_understand_label']
+
+    config['labels_settings'] = list(labels_settings.values())
+    return config
@@ -0,0 +1,38 @@
+import argparse
+import sys
+
+from deepcubes_services.services.sentiment_model import compare_models, load_sentiment_model
+
+
+parser = argparse.ArgumentParser(
+    description='Check outputs of quantized sentiment model against eager one')
+parser.add_argument('-m', '--model', required=True,
+                    help="Path sentiment model cube file.")
+parser.add_argument('-n', '--neural', required=True,
+                    help="Path to sentiment model torch state dict file.")
+parser.add_argument('-d', '--data', required=True,
+                    help="Path to text file with one query per line.")
+parser.add_argument('-t', '--tolerance', type=float, default=0.02,
+                    help="Max allowed absolute difference of positive probabilities.")
+parser.add_argument('-b', '--batch_size', type=int, default=32)
+args = parser.parse_args()
+
+with open(args.data, "r") as infile:
+    queries = [line.strip() for line in infile if line.strip()]
+
+reference_model = load_sentiment_model(args.model, args.neural)
+quantized_model = load_sentiment_model(args.model, args.neural, quantize=True)
+
+result = compare_models(reference_model, quantized_model, queries, args.batch_size,
+                        args.tolerance)
+
+print('Queries: {}'.format(len(queries)))
+print('Max absolute difference: {:.6f} (tolerance {})'.format(
+    result['max_abs_diff'], args.tolerance))
+print('Labels agreement: {:.4f}'.format(result['agreement']))
+print('Eager: {:.3f} s, quantized: {:.3f} s'.format(
+    result['reference_seconds'], result['seconds']))
+
+if not result['passed']:
+    print('Quantized model outputs differ more than tolerance')
+    sys.exit(1)
@@ -0,0 +1,24 @@
+import argparse
+import os
+
+from deepcubes_services.services.embedders import convert_to_mmap
+
+
+def main(kv_path, out_path):
+    if out_path is None:
+        out_path = '{}.npy'.format(os.path.splitext(kv_path)[0])
+
+    convert_to_mmap(kv_path, out_path)
+    print('Converted {} to memory-mappable {}'.format(kv_path, out_path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert gensim .kv embeddings to memory-mappable .npy and .vocab files'
+    )
+
+    parser.add_argument('-i', '--kv_path', required=True)
+    parser.add_argument('-o', '--out_path', default=None)
+
+    args = parser.parse_args()
+    main(args.kv_path, args.out_path)
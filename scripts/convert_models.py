@@ -0,0 +1,38 @@
+import argparse
+import os
+
+from deepcubes_services.services.model_storage import (
+    FORMAT_BINARY,
+    MODEL_FORMATS,
+    convert_model_file,
+)
+
+
+def main(model_storage, model_format):
+    converted_count, skipped_count = 0, 0
+
+    for file_name in sorted(os.listdir(model_storage)):
+        if not file_name.endswith('.cube'):
+            continue
+
+        model_path = os.path.join(model_storage, file_name)
+        if convert_model_file(model_path, model_format):
+            converted_count += 1
+            print('Converted {}'.format(model_path))
+        else:
+            skipped_count += 1
+
+    print('Converted {} models to {} format, {} models already were in it'.format(
+        converted_count, model_format, skipped_count))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert all models of models storage to given format'
+    )
+
+    parser.add_argument('-s', '--model_storage', required=True)
+    parser.add_argument('-f', '--format', choices=MODEL_FORMATS, default=FORMAT_BINARY)
+
+    args = parser.parse_args()
+    main(args.model_storage, args.format)
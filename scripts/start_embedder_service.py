@@ -1,8 +1,8 @@
 import configparser
-import logging
 import argparse
 
 from deepcubes_services.services import EmbedderService
+from deepcubes_services.services.request_logging import setup_logging
 
 
 parser = argparse.ArgumentParser(description='Embedder service starter')
@@ -12,15 +12,11 @@ parser.add_argument('-p', '--port', type=int, default=3333,
                     help="Port at which service will be opened.")
 parser.add_argument('-l', '--logs', default="scripts/logs/embedder_service.log",
                     help="Path to log file.")
+parser.add_argument('--log_sample_rate', type=float, default=1.0,
+                    help="Part of logged requests, errors are always logged.")
 args = parser.parse_args()
 
-logger = logging.getLogger("EmbedderService")
-logger.setLevel(logging.INFO)
-
-handler = logging.FileHandler(args.logs)
-formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+logger = setup_logging("EmbedderService", args.logs, args.log_sample_rate)
 
 config_file_path = args.config
 config_parser = configparser.ConfigParser()
@@ -1,8 +1,8 @@
 import argparse
-import logging
 import configparser
 
 from deepcubes_services.services import MultistageClassifierService
+from deepcubes_services.services.request_logging import setup_logging
 
 
 parser = argparse.ArgumentParser(description='Multistage Classifier service')
@@ -12,17 +12,12 @@ parser.add_argument('-p', '--port', type=int, default=3333,
                     help="Port at which service will be opened.")
 parser.add_argument('-l', '--logs', default="scripts/logs/multistage_classifier_service.log",
                     help="Path to log file.")
+parser.add_argument('--log_sample_rate', type=float, default=1.0,
+                    help="Part of logged requests, errors are always logged.")
 args = parser.parse_args()
 
 
-logger = logging.getLogger("MultistageClassifierService")
-logger.setLevel(logging.INFO)
-
-handler = logging.FileHandler(args.logs)
-
-formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+logger = setup_logging("MultistageClassifierService", args.logs, args.log_sample_rate)
 
 config_file_path = args.config
 config_parser = configparser.RawConfigParser()
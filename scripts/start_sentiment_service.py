@@ -1,10 +1,11 @@
-import logging
 import argparse
 import sys
-import json
 
-from deepcubes.models.sentiment import Sentiment
+import torch
+
 from deepcubes_services.services import SentimentService
+from deepcubes_services.services.request_logging import setup_logging
+from deepcubes_services.services.sentiment_model import load_sentiment_model
 
 
 parser = argparse.ArgumentParser(description='Sentiment Service starter')
@@ -16,16 +17,26 @@ parser.add_argument('-p', '--port', type=int, default=3333,
                     help="Port at which service will be opened.")
 parser.add_argument('-l', '--logs', default="scripts/logs/sentiment_service.log",
                     help="Path to log file.")
+parser.add_argument('--log_sample_rate', type=float, default=1.0,
+                    help="Part of logged requests, errors are always logged.")
+parser.add_argument('-t', '--threads', type=int, default=None,
+                    help="Number of torch intra-op threads, torch default if not set.")
+parser.add_argument('--max_batch_size', type=int, default=32,
+                    help="Max number of queries in one forward pass.")
+parser.add_argument('--max_batch_wait_ms', type=float, default=5,
+                    help="Max time request waits for other ones to be batched.")
+parser.add_argument('--no_batching', action='store_true',
+                    help="Run forward pass for every request separately.")
+parser.add_argument('-q', '--quantize', action='store_true',
+                    help="Use dynamic int8 quantization of linear and recurrent layers, "
+                         "check outputs with scripts/check_sentiment_model.py")
 args = parser.parse_args()
 
-with open(args.model, "r") as infile:
-    model_params = json.load(infile)
-model = Sentiment.load(model_params, args.neural)
+if args.threads is not None:
+    torch.set_num_threads(args.threads)
 
 try:
-    with open(args.model, "r") as infile:
-        model_params = json.load(infile)
-    model = Sentiment.load(model_params, args.neural)
+    model = load_sentiment_model(args.model, args.neural, args.quantize)
 except Exception:
     _, exc_obj, exc_tb = sys.exc_info()
     print("Error while loading the model.")
@@ -33,14 +44,9 @@ except Exception:
     sys.exit()
 
 
-logger = logging.getLogger("SentimentService")
-logger.setLevel(logging.INFO)
-
-# create the logging file handler
-handler = logging.FileHandler(args.logs)
-formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+logger = setup_logging("SentimentService", args.logs, args.log_sample_rate)
 
-service = SentimentService(logger, model)
+service = SentimentService(logger, model, batching=not args.no_batching,
+                           max_batch_size=args.max_batch_size,
+                           max_batch_wait_ms=args.max_batch_wait_ms)
 service.run(args.port)
@@ -0,0 +1,25 @@
+import argparse
+import configparser
+
+from deepcubes_services.services.host import ServiceHost
+from deepcubes_services.services.request_logging import setup_logging
+
+
+parser = argparse.ArgumentParser(description='Launch several services in one process')
+parser.add_argument('-c', '--config', type=str, required=True,
+                    help="Path to config file")
+parser.add_argument('-p', '--port', type=int, default=3333,
+                    help="Port at which services will be opened.")
+parser.add_argument('-l', '--logs', default="scripts/logs/service_host.log",
+                    help="Path to log file.")
+parser.add_argument('--log_sample_rate', type=float, default=1.0,
+                    help="Part of logged requests, errors are always logged.")
+args = parser.parse_args()
+
+logger = setup_logging("ServiceHost", args.logs, args.log_sample_rate)
+
+config_parser = configparser.RawConfigParser()
+config_parser.read(args.config)
+
+service = ServiceHost(config_parser, logger)
+service.run(args.port)
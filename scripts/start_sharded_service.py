@@ -0,0 +1,71 @@
+import argparse
+import configparser
+import multiprocessing
+import signal
+import sys
+
+from deepcubes_services.services import IntentClassifierService, VeraLiveDialogService
+from deepcubes_services.services.request_logging import setup_logging, stop_logging
+from deepcubes_services.services.shard_router import ShardRouter
+
+
+SERVICES = {
+    'live-dialog': VeraLiveDialogService,
+    'intent-classifier': IntentClassifierService,
+}
+
+
+parser = argparse.ArgumentParser(description='Launch service workers behind shard router')
+parser.add_argument('-s', '--service', choices=sorted(SERVICES), required=True,
+                    help="Service to launch in worker processes")
+parser.add_argument('-c', '--config', type=str, required=True,
+                    help="Path to config file")
+parser.add_argument('-p', '--port', type=int, default=3333,
+                    help="Port of router, workers use next ports.")
+parser.add_argument('-w', '--workers', type=int, default=4,
+                    help="Number of worker processes")
+parser.add_argument('-m', '--model_id_list', nargs='+', type=int, default=list(),
+                    help="List with model_ids that will be loaded by their workers")
+parser.add_argument('-l', '--logs', default="scripts/logs/sharded_service.log",
+                    help="Path to log file.")
+parser.add_argument('--log_sample_rate', type=float, default=1.0,
+                    help="Part of logged requests, errors are always logged.")
+args = parser.parse_args()
+
+
+def get_logger(name):
+    return setup_logging(name, args.logs, args.log_sample_rate,
+                         log_format='%(asctime)s | %(name)s | %(levelname)s | %(message)s')
+
+
+def run_worker(index, port, model_ids):
+    config_parser = configparser.RawConfigParser()
+    config_parser.read(args.config)
+
+    logger = get_logger("Worker{}".format(index))
+
+    # workers are terminated by router process and don't run `atexit`
+    # handlers, so queued log records are written on SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        service = SERVICES[args.service](config_parser, logger, model_ids)
+        service.run(port)
+    finally:
+        stop_logging(logger)
+
+
+config_parser = configparser.RawConfigParser()
+config_parser.read(args.config)
+
+worker_ports = [args.port + 1 + index for index in range(args.workers)]
+workers = ["http://127.0.0.1:{}".format(port) for port in worker_ports]
+
+router = ShardRouter.from_config(config_parser, get_logger("ShardRouter"), workers)
+
+for index, (worker, port) in enumerate(zip(workers, worker_ports)):
+    process = multiprocessing.Process(
+        target=run_worker, args=(index, port, router.get_shard(worker, args.model_id_list)),
+        daemon=True)
+    process.start()
+
+router.run(args.port)
@@ -1,8 +1,8 @@
 import argparse
-import logging
 import configparser
 
 from deepcubes_services.services import VeraLiveDialogService
+from deepcubes_services.services.request_logging import setup_logging
 
 
 parser = argparse.ArgumentParser(description='Launch Vera Live Dialog API')
@@ -14,16 +14,11 @@ parser.add_argument('-m', '--model_id_list', nargs='+', type=int, default=list()
                     help="List with model_ids that will be loaded")
 parser.add_argument('-l', '--logs', default="scripts/logs/vera_live_dialog_service.log",
                     help="Path to log file.")
+parser.add_argument('--log_sample_rate', type=float, default=1.0,
+                    help="Part of logged requests, errors are always logged.")
 args = parser.parse_args()
 
-logger = logging.getLogger("VeraLiveDialogService")
-logger.setLevel(logging.INFO)
-
-# create the logging file handler
-handler = logging.FileHandler(args.logs)
-formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+logger = setup_logging("VeraLiveDialogService", args.logs, args.log_sample_rate)
 
 config_file_path = args.config
 config_parser = configparser.RawConfigParser()
@@ -2,15 +2,20 @@ import argparse
 import configparser
 import os
 from pprint import pprint
-import json
 
 import pandas as pd
 
 from deepcubes.models import VeraLiveDialog
 from deepcubes_services.services.embedders import NetworkEmbedder
+from deepcubes_services.services.model_registry import ModelRegistry
+from deepcubes_services.services.model_storage import (
+    FORMAT_JSON,
+    MODEL_FORMATS,
+    save_model_params,
+)
 
 
-def main(csv_path, lang, config_path, model_id):
+def main(csv_path, lang, config_path, model_id, model_format=FORMAT_JSON):
 
     config_parser = configparser.ConfigParser()
     config_parser.read(config_path)
@@ -62,10 +67,8 @@ def main(csv_path, lang, config_path, model_id):
 
     clf_params = live_dialog_model.save()
     clf_path = os.path.join(MODEL_STORAGE, '{}.cube'.format(model_id))
-
-    os.makedirs(MODEL_STORAGE, exist_ok=True)
-    with open(clf_path, 'w') as out:
-        out.write(json.dumps(clf_params))
+    save_model_params(clf_path, clf_params, model_format)
+    ModelRegistry(MODEL_STORAGE).register(model_id, lang, LANG_TO_EMB_MODE[lang])
 
     if model_id is not None:
         print('Created live dialog model with id {}'.format(model_id))
@@ -80,6 +83,7 @@ if __name__ == '__main__':
     parser.add_argument('-l', '--lang', required=True)
     parser.add_argument('-c', '--config', required=True)
     parser.add_argument('-m', '--model_id', required=True)
+    parser.add_argument('-f', '--format', choices=MODEL_FORMATS, default=FORMAT_JSON)
 
     args = parser.parse_args()
-    main(args.csv_path, args.lang, args.config, args.model_id)
+    main(args.csv_path, args.lang, args.config, args.model_id, args.format)
@@ -0,0 +1,96 @@
+import unittest
+
+import requests
+
+from deepcubes_services.services.balancer import Balancer
+from deepcubes_services.services.embedders import EmbedderFactory, NetworkEmbedder
+
+
+class BalancerTest(unittest.TestCase):
+
+    def test_least_outstanding(self):
+        balancer = Balancer(["a", "b"])
+
+        first = balancer.acquire()
+        second = balancer.acquire()
+        self.assertNotEqual(first, second)
+
+        balancer.release(first)
+        self.assertEqual(first, balancer.acquire())
+
+    def test_round_robin(self):
+        balancer = Balancer(["a", "b", "c"], policy=Balancer.ROUND_ROBIN)
+
+        endpoints = list()
+        for _ in range(6):
+            endpoint = balancer.acquire()
+            balancer.release(endpoint)
+            endpoints.append(endpoint)
+
+        self.assertEqual(["a", "b", "c", "a", "b", "c"], endpoints)
+
+    def test_failed_endpoint(self):
+        balancer = Balancer(["a", "b"], failure_cooldown=60)
+
+        balancer.release(balancer.acquire(exclude=["b"]), failed=True)
+        for _ in range(4):
+            endpoint = balancer.acquire()
+            balancer.release(endpoint)
+            self.assertEqual("b", endpoint)
+
+        self.assertFalse(balancer.stats()["a"]["healthy"])
+
+        balancer.release(balancer.acquire(), failed=True)
+        self.assertEqual("a", balancer.acquire())
+
+
+class FailingHostSession(object):
+    """Test session, requests to `failed_host` raise connection error"""
+
+    def __init__(self, failed_host):
+        self.failed_host = failed_host
+        self.urls = list()
+
+    def post(self, url, **kwargs):
+        self.urls.append(url)
+        if url.startswith(self.failed_host):
+            raise requests.ConnectionError(url)
+
+        response = requests.Response()
+        response.status_code = 200
+        return response
+
+
+class SharedBalancerTest(unittest.TestCase):
+
+    def test_modes_share_services_health(self):
+        hosts = ["http://shared-balancer-a:3333", "http://shared-balancer-b:3333"]
+        session = FailingHostSession(hosts[0])
+
+        first = NetworkEmbedder(["{}/first".format(host) for host in hosts],
+                                session=session, failure_cooldown=60)
+        second = NetworkEmbedder(["{}/second".format(host) for host in hosts],
+                                 session=session, failure_cooldown=60)
+        self.assertIs(first.balancer, second.balancer)
+
+        # failure of host `a` found by `first` mode is skipped by `second` mode
+        while first.balancer.stats()[hosts[0]]["healthy"]:
+            first._post("encode_queries")
+
+        session.urls = list()
+        for _ in range(4):
+            second._post("encode_queries")
+
+        self.assertEqual(["{}/second/encode_queries".format(hosts[1])] * 4, session.urls)
+
+    def test_services_are_not_retried(self):
+        def get_retry(factory):
+            return factory.session.get_adapter("http://host").max_retries
+
+        single = EmbedderFactory("http://retries-single:3333")
+        self.assertEqual(3, get_retry(single).total)
+        self.assertEqual(0, get_retry(single).read)
+
+        # balancer fails over to the next service instead
+        several = EmbedderFactory("http://retries-a:3333, http://retries-b:3333")
+        self.assertEqual(0, get_retry(several).total)
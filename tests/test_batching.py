@@ -0,0 +1,51 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from deepcubes_services.services.batching import MicroBatcher
+
+
+class InverseLength(object):
+    """Test batch function, fails on empty strings"""
+
+    def __init__(self):
+        self.batches = list()
+        self.lock = threading.Lock()
+
+    def __call__(self, items):
+        with self.lock:
+            self.batches.append(list(items))
+
+        return [1.0 / len(item) for item in items]
+
+
+class MicroBatcherTest(unittest.TestCase):
+
+    def test_failed_call_is_isolated(self):
+        func = InverseLength()
+        batcher = MicroBatcher(func, max_batch_size=16, max_wait_ms=100)
+
+        def submit(item):
+            try:
+                return batcher.submit([item])[0]
+            except ZeroDivisionError:
+                return None
+
+        items = ['a', '', 'ab', 'abcd']
+        with ThreadPoolExecutor(max_workers=len(items)) as executor:
+            results = list(executor.map(submit, items))
+
+        self.assertEqual([1.0, None, 0.5, 0.25], results)
+
+    def test_large_submit_is_split(self):
+        func = InverseLength()
+        batcher = MicroBatcher(func, max_batch_size=4, max_wait_ms=1)
+
+        items = ['a' * length for length in range(1, 11)]
+        self.assertEqual([1.0 / len(item) for item in items], batcher.submit(items))
+        self.assertTrue(all(len(batch) <= 4 for batch in func.batches))
+        self.assertEqual(len(items), sum(len(batch) for batch in func.batches))
+
+
+if __name__ == '__main__':
+    unittest.main()
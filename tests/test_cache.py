@@ -0,0 +1,96 @@
+import time
+import unittest
+
+from deepcubes_services.services.cache import LRUCache, PredictionCache, cached_batch
+from deepcubes_services.services.embedders import get_shared_cache
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_eviction(self):
+        cache = LRUCache(2, sizeof=len)
+
+        cache.put("a", [1])
+        cache.put("b", [2])
+        self.assertEqual([1], cache.get("a"))
+
+        cache.put("c", [3])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([1], cache.get("a"))
+        self.assertEqual(1, cache.stats()["evictions"])
+
+        bytes_cache = LRUCache(10, max_bytes=3, sizeof=len)
+        bytes_cache.put("a", [1, 1])
+        bytes_cache.put("b", [2, 2])
+        self.assertIsNone(bytes_cache.get("a"))
+        self.assertEqual(2, bytes_cache.stats()["bytes"])
+
+    def test_ttl(self):
+        cache = LRUCache(2, sizeof=len, ttl=0.05)
+
+        cache.put("a", [1])
+        self.assertEqual([1], cache.get("a"))
+
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(0, len(cache))
+
+    def test_cached_batch(self):
+        cache = LRUCache(10, sizeof=len)
+        calls = list()
+
+        def encode(items):
+            calls.append(items)
+            return [[item.upper()] for item in items]
+
+        encode_cached = cached_batch(encode, cache, str.strip)
+
+        self.assertEqual([["A"], ["B"]], encode_cached(["a", "b"]))
+        self.assertEqual([["C"], ["A"], ["C"]], encode_cached(["c", " a", "c"]))
+        self.assertEqual([["a", "b"], ["c"]], calls)
+
+
+class PredictionCacheTest(unittest.TestCase):
+
+    def test_model_replaced_while_fetched(self):
+        cache = PredictionCache(10)
+        models = {1: "old"}
+
+        def predict_with(model):
+            return lambda queries: ["{} {}".format(model, query) for query in queries]
+
+        generation, model = cache.get_model(1, models.get)
+        self.assertEqual(["old a"], cache.predict(1, generation, ["a"], predict_with(model)))
+
+        # model is reloaded by the request itself, e.g. its file was changed
+        def reload_model(model_id):
+            if models[model_id] == "old":
+                models[model_id] = "new"
+                cache.invalidate(model_id)
+            return models[model_id]
+
+        generation, model = cache.get_model(1, reload_model)
+        self.assertEqual("new", model)
+        self.assertEqual(["new a"], cache.predict(1, generation, ["a"], predict_with(model)))
+
+    def test_exact_queries(self):
+        cache = PredictionCache(10)
+
+        # e.g. live dialog patterns match raw query
+        def predict(queries):
+            return ["spaces" if "  " in query else "words" for query in queries]
+
+        self.assertEqual(["words"], cache.predict(1, 0, ["a b"], predict))
+        self.assertEqual(["spaces", "words"], cache.predict(1, 0, ["a  b", "a b"], predict))
+
+
+class SharedCacheTest(unittest.TestCase):
+
+    def test_settings_conflict(self):
+        url = "http://shared-cache-test:3333"
+
+        cache = get_shared_cache(url, 10, ttl=5.0)
+        self.assertIs(cache, get_shared_cache(url, 10, ttl=5.0))
+
+        with self.assertRaises(ValueError):
+            get_shared_cache(url, 20, ttl=5.0)
@@ -1,8 +1,12 @@
+import os
 import unittest
 import logging
 import configparser
+from concurrent.futures import ThreadPoolExecutor
 
 from deepcubes_services.services import EmbedderService
+from deepcubes_services.services.embedders import convert_to_mmap
+from deepcubes_services.services.vectors_format import NPY_MIMETYPE, decode_vectors
 from deepcubes.cubes import Tokenizer
 
 
@@ -41,3 +45,109 @@ class EmbedderServiceTest(unittest.TestCase):
             -1.5613,
             3
         )
+
+    def test_batched_requests(self):
+        logger = logging.getLogger("EmbedderTestService")
+
+        config_parser = configparser.ConfigParser()
+        config_parser.read("tests/data/embedder_service/embedder_service.conf")
+        config_parser["embedder-service"] = {
+            "BATCHING": "true",
+            "MAX_BATCH_SIZE": "4",
+            "MAX_BATCH_WAIT_MS": "10",
+        }
+
+        app = EmbedderService(config_parser, logger).create_flask_app()
+        batched_service = app.test_client()
+
+        queries = ["Робот Вера", "Вера", "Робот", "привет Вера", "как дела"]
+        expected = self.service.post(
+            '/test/encode_queries', json={"queries": queries}
+        ).get_json()["vectors"]
+
+        def encode(query):
+            response = batched_service.post('/test/encode_queries',
+                                            json={"queries": [query]})
+            return response.get_json()["vectors"][0]
+
+        with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+            generated_vectors = list(executor.map(encode, queries))
+
+        for vector, expected_vector in zip(generated_vectors, expected):
+            for value, expected_value in zip(vector, expected_vector):
+                self.assertAlmostEqual(value, expected_value, 5)
+
+    def test_mmap_embedder(self):
+        models_storage = "tests/models/embeddings"
+        os.makedirs(models_storage, exist_ok=True)
+
+        mmap_path = os.path.join(models_storage, "test_embeds.npy")
+        convert_to_mmap("tests/data/test_embeds.kv", mmap_path)
+
+        logger = logging.getLogger("EmbedderTestService")
+
+        config_parser = configparser.ConfigParser()
+        config_parser["embedders"] = {"test": mmap_path, "test2": mmap_path}
+
+        app = EmbedderService(config_parser, logger).create_flask_app()
+        mmap_service = app.test_client()
+
+        for name in ["test", "test2"]:
+            response = mmap_service.post('/{}/encode_queries'.format(name),
+                                         json={"queries": ["Робот Вера"]})
+            generated_vectors = response.get_json()["vectors"]
+            self.assertAlmostEqual(
+                sum(generated_vectors[0]),
+                -1.5613,
+                3
+            )
+
+    def test_cached_requests(self):
+        logger = logging.getLogger("EmbedderTestService")
+
+        config_parser = configparser.ConfigParser()
+        config_parser.read("tests/data/embedder_service/embedder_service.conf")
+        config_parser["embedder-service"] = {"CACHE_SIZE": "2"}
+
+        app = EmbedderService(config_parser, logger).create_flask_app()
+        cached_service = app.test_client()
+
+        for queries in [["Робот Вера"], [" Робот  Вера "], ["Робот Вера", "да", "нет"]]:
+            response = cached_service.post('/test/encode_queries',
+                                           json={"queries": queries})
+            generated_vectors = response.get_json()["vectors"]
+            self.assertEqual(len(queries), len(generated_vectors))
+            self.assertAlmostEqual(
+                sum(generated_vectors[0]),
+                -1.5613,
+                3
+            )
+
+        stats = cached_service.get('/test/cache_stats').get_json()["queries"]
+        self.assertEqual(2, stats["hits"])
+        self.assertEqual(3, stats["misses"])
+        self.assertEqual(2, stats["entries"])
+        self.assertEqual(1, stats["evictions"])
+
+    def test_binary_vectors_format(self):
+        queries = ["Робот Вера", "Вера"]
+
+        response = self.service.post('/test/encode_queries',
+                                     json={"queries": queries, "format": "float32"})
+        generated_vectors = decode_vectors(response.data, response.mimetype)
+        self.assertEqual(2, generated_vectors.shape[0])
+        self.assertAlmostEqual(
+            float(generated_vectors[0].sum()),
+            -1.5613,
+            3
+        )
+
+        response = self.service.post('/test/encode_queries', json={"queries": queries},
+                                     headers={"Accept": NPY_MIMETYPE})
+        self.assertEqual(NPY_MIMETYPE, response.mimetype)
+        generated_vectors = decode_vectors(response.data, response.mimetype)
+        self.assertAlmostEqual(
+            float(generated_vectors[0].sum()),
+            -1.5613,
+            3
+        )
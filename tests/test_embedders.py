@@ -0,0 +1,46 @@
+import unittest
+
+from deepcubes.cubes import Tokenizer
+
+from deepcubes_services.services.embedders import EmbedderFactory, SharedQueriesFactory
+
+
+class CountingFactory(EmbedderFactory):
+    """Factory creating placeholder embedders, counts their loads"""
+
+    def __init__(self):
+        super().__init__("")
+        self.loads = list()
+
+    def _create(self, embedder_mode, tokenizer_mode):
+        self.loads.append((embedder_mode, tokenizer_mode))
+        return object()
+
+
+class EmbedderFactoryTest(unittest.TestCase):
+
+    def test_tokenizer_mode_forms(self):
+        factory = CountingFactory()
+
+        embedder = factory.create("test_embeds", Tokenizer.Mode.TOKEN)
+        self.assertIs(embedder, factory.create("test_embeds", "token"))
+
+        self.assertEqual([("test_embeds", Tokenizer.Mode.TOKEN)], factory.loads)
+        self.assertEqual({"test_embeds/token": 2}, factory.stats())
+
+        factory.release(embedder)
+        factory.release(embedder)
+        self.assertEqual({}, factory.stats())
+
+    def test_shared_queries_tokenizer_mode_forms(self):
+        factory = CountingFactory()
+        shared_factory = SharedQueriesFactory(factory)
+
+        embedder = shared_factory.create("test_embeds", "token")
+        self.assertIs(embedder, shared_factory.create("test_embeds", Tokenizer.Mode.TOKEN))
+        self.assertEqual(["test_embeds/token"], list(shared_factory.embedders()))
+        self.assertEqual(1, len(factory.loads))
+
+
+if __name__ == "__main__":
+    unittest.main()
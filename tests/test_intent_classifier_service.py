@@ -1,5 +1,6 @@
 import json
 import os
+import shutil
 import unittest
 import logging
 import configparser
@@ -8,6 +9,11 @@ from deepcubes_services.services import IntentClassifierService
 from deepcubes.embedders import LocalEmbedder
 from deepcubes.cubes import Tokenizer, Classifier
 from deepcubes.models import IntentClassifier
+from deepcubes_services.services.model_storage import (
+    FORMAT_BINARY,
+    convert_model_file,
+    get_model_format,
+)
 from deepcubes_services.services.utils import get_new_model_id
 
 
@@ -87,6 +93,75 @@ class IntentClassifierServiceTest(unittest.TestCase):
             for key in self.output_keys:
                 self.assertIn(key, output)
 
+    def test_batch_requests(self):
+        queries = ['название', 'чем занимается ваша фирма', 'название']
+        predict_resp = self.service.post(
+            '/predict_batch', json={
+                'queries': queries,
+                'model_id': self.model_id,
+                'top_k': 1,
+            }
+        )
+
+        predict_resp_data = json.loads(predict_resp.data.decode("utf-8"))
+        self.assertEqual(len(queries), len(predict_resp_data))
+
+        for output, query in zip(predict_resp_data, queries):
+            self.assertEqual(1, len(output))
+            for key in self.output_keys:
+                self.assertIn(key, output[0])
+
+            single_output = self._get_predict_response(query=query, model_id=self.model_id)
+            self.assertEqual(single_output[0]['answer'], output[0]['answer'])
+            self.assertAlmostEqual(single_output[0]['probability'],
+                                   output[0]['probability'], 5)
+
+    def test_wrong_top_k(self):
+        predict_resp = self.service.post('/predict', json={
+            'query': 'название', 'model_id': self.model_id, 'top_k': 0})
+
+        self.assertEqual(400, predict_resp.status_code)
+        self.assertIn('top_k', predict_resp.get_json()['description'])
+
+    def test_binary_model_format(self):
+        json_output = self._get_predict_response(query='название', model_id=self.model_id)
+
+        self.assertTrue(convert_model_file(self.clf_path, FORMAT_BINARY))
+        self.assertEqual(FORMAT_BINARY, get_model_format(self.clf_path))
+
+        binary_output = self._get_predict_response(query='название', model_id=self.model_id)
+        self.assertEqual(len(json_output), len(binary_output))
+        for json_answer, binary_answer in zip(json_output, binary_output):
+            self.assertEqual(json_answer['answer'], binary_answer['answer'])
+            self.assertAlmostEqual(json_answer['probability'], binary_answer['probability'], 5)
+
+    def test_shared_embedders(self):
+        logger = logging.getLogger("IntentClassifierTestService")
+
+        config_parser = configparser.ConfigParser()
+        config_parser.read(
+            "tests/data/intent_classifier_service/intent_classifier_service.conf"
+        )
+        config_parser.set("classifier-service", "MODEL_CACHE_SIZE", "1")
+        service = IntentClassifierService(config_parser, logger)
+
+        second_model_id = self.model_id + 1
+        second_clf_path = os.path.join(
+            self.model_storage, '{}.cube'.format(second_model_id)
+        )
+        shutil.copyfile(self.clf_path, second_clf_path)
+
+        try:
+            service.models.get(self.model_id)
+            self.assertEqual([1], list(service.embedder_factory.stats().values()))
+
+            # second model shares the embedder and evicts the first one
+            service.models.get(second_model_id)
+            self.assertNotIn(self.model_id, service.models)
+            self.assertEqual([1], list(service.embedder_factory.stats().values()))
+        finally:
+            os.remove(second_clf_path)
+
     def _get_predict_response(self, query, model_id):
         predict_resp = self.service.post(
             '/predict', json={
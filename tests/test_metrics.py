@@ -0,0 +1,90 @@
+import unittest
+
+from flask import Flask, request
+from flask_json import FlaskJSON, JsonError, as_json
+
+from deepcubes_services.services.metrics import (MetricsRegistry, instrument_app,
+                                                 label_request)
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def test_render(self):
+        metrics = MetricsRegistry(buckets=(0.1, 1.0))
+        metrics.describe("requests_total", "counter", "Requests")
+        metrics.describe("latency_seconds", "histogram", "Latency")
+
+        metrics.inc("requests_total", (("route", "/predict"),))
+        metrics.inc("requests_total", (("route", "/predict"),))
+        for value in [0.05, 0.5, 5.0]:
+            metrics.observe("latency_seconds", (("model_id", "1"),), value)
+        metrics.add_collector(lambda: [("cache_hits", (("kind", "queries"),), 3)])
+
+        lines = metrics.render().splitlines()
+
+        self.assertIn("# TYPE requests_total counter", lines)
+        self.assertIn('requests_total{route="/predict"} 2', lines)
+        self.assertIn('latency_seconds_bucket{model_id="1",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{model_id="1",le="1.0"} 2', lines)
+        self.assertIn('latency_seconds_bucket{model_id="1",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count{model_id="1"} 3', lines)
+        self.assertIn('cache_hits{kind="queries"} 3', lines)
+
+
+class InstrumentAppTest(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+
+        @app.route("/predict", methods=["POST"])
+        @as_json
+        def predict():
+            model_id = int(request.json["model_id"])
+            if model_id < 0:
+                raise JsonError(description="Model {} not found".format(model_id))
+
+            label_request(model_id=model_id)
+            return {"answer": "hello"}
+
+        @app.route("/<name>/encode_queries", methods=["POST"])
+        @as_json
+        def encode_queries(name):
+            label_request(name=name)
+            return {"vectors": []}
+
+        instrument_app(app, MetricsRegistry(), max_label_values=2)
+        FlaskJSON(app)
+
+        self.service = app.test_client()
+
+    def test_requests(self):
+        self.service.post("/predict", json={"model_id": 7})
+        self.service.post("/predict", json={"model_id": -1})
+        self.service.post("/test/encode_queries", data={"queries": "a"})
+
+        text = self.service.get("/metrics").data.decode("utf-8")
+
+        self.assertIn('requests_total{route="/predict",status="200"} 1', text)
+        self.assertIn('requests_total{route="/predict",status="400"} 1', text)
+        self.assertIn('request_errors_total{route="/predict"} 1', text)
+        self.assertIn('model_request_duration_seconds_count{route="/predict",model_id="7"} 1',
+                      text)
+        self.assertNotIn('model_id="-1"', text)
+        self.assertIn('embedder_request_duration_seconds_count'
+                      '{route="/<name>/encode_queries",name="test"} 1', text)
+
+    def test_label_values_limit(self):
+        for model_id in range(5):
+            self.service.post("/predict", json={"model_id": model_id})
+
+        text = self.service.get("/metrics").data.decode("utf-8")
+
+        self.assertIn('model_request_duration_seconds_count{route="/predict",model_id="1"} 1',
+                      text)
+        self.assertIn('model_request_duration_seconds_count'
+                      '{route="/predict",model_id="other"} 3', text)
+        self.assertNotIn('model_id="4"', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
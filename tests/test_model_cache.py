@@ -0,0 +1,192 @@
+import configparser
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from deepcubes_services.services.metrics import create_service_metrics
+from deepcubes_services.services.model_cache import ModelCache, StoredModels
+from deepcubes_services.services.model_storage import save_model_params
+
+
+class ModelCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = list()
+
+    def _load_model(self, model_id):
+        self.loads.append(model_id)
+        return "model {}".format(model_id)
+
+    def test_lru_eviction(self):
+        models = ModelCache(self._load_model, max_models=2, pinned=[0])
+
+        for model_id in [0, 1, 2, 1, 3, 2]:
+            self.assertEqual("model {}".format(model_id), models.get(model_id))
+
+        self.assertIn(0, models)
+        self.assertIn(2, models)
+        self.assertNotIn(3, models)
+        self.assertEqual([0, 1, 2, 1, 3, 2], self.loads)
+
+        stats = models.stats()
+        self.assertEqual(4, stats["evictions"])
+        self.assertEqual(2, stats["reloads"])
+
+    def test_lfu_eviction(self):
+        models = ModelCache(self._load_model, max_models=2, policy=ModelCache.LFU)
+
+        for model_id in [1, 1, 2, 3]:
+            models.get(model_id)
+
+        self.assertIn(1, models)
+        self.assertIn(3, models)
+        self.assertNotIn(2, models)
+
+    def test_lfu_keeps_inserted_model(self):
+        models = ModelCache(self._load_model, max_models=1, policy=ModelCache.LFU)
+
+        for model_id in [1, 1, 2, 2]:
+            models.get(model_id)
+
+        self.assertIn(2, models)
+        self.assertNotIn(1, models)
+        self.assertEqual([1, 2], self.loads)
+
+    def test_lfu_decay(self):
+        models = ModelCache(self._load_model, max_models=2, policy=ModelCache.LFU,
+                            lfu_decay=4)
+
+        # model 1 was hot long ago, model 2 is used now
+        for model_id in [1] * 8 + [2] * 6 + [3]:
+            models.get(model_id)
+
+        self.assertIn(2, models)
+        self.assertIn(3, models)
+        self.assertNotIn(1, models)
+
+    def test_version_interval(self):
+        versions = {1: 0}
+        checks = list()
+
+        def version(model_id):
+            checks.append(model_id)
+            return versions[model_id]
+
+        models = ModelCache(self._load_model, version=version, version_interval=0.05)
+
+        models.get(1)
+        versions[1] = 1
+        models.get(1)
+        self.assertEqual([1], self.loads)
+
+        time.sleep(0.06)
+        models.get(1)
+        models.get(1)
+        self.assertEqual([1, 1], self.loads)
+        # version is read by missed requests and puts only
+        self.assertEqual([1, 1, 1, 1], checks)
+
+    def test_bytes_bound(self):
+        models = ModelCache(self._load_model, max_bytes=25, sizeof=lambda model_id: 10)
+
+        for model_id in [1, 2, 3]:
+            models.get(model_id)
+
+        self.assertEqual(2, len(models))
+        self.assertEqual(20, models.stats()["bytes"])
+
+    def test_single_flight_loading(self):
+        def load_slow_model(model_id):
+            time.sleep(0.1)
+            return self._load_model(model_id)
+
+        models = ModelCache(load_slow_model)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            loaded_models = list(executor.map(models.get, [1] * 8))
+
+        self.assertEqual(["model 1"] * 8, loaded_models)
+        self.assertEqual([1], self.loads)
+
+    def test_preload(self):
+        models = ModelCache(self._load_model)
+        futures = models.preload([1, 2, 3], max_workers=2)
+
+        for model_id, future in futures.items():
+            self.assertEqual("model {}".format(model_id), future.result())
+
+        self.assertEqual(3, len(models))
+
+
+class LabelModel(object):
+    """Test model, answers its label to every query"""
+
+    def __init__(self, label, embedder):
+        self.label = label
+        self.embedder = embedder
+
+    @classmethod
+    def load(cls, params, factory):
+        return cls(params["label"], factory.create("test"))
+
+    def __call__(self, queries):
+        return [self.label for _ in queries]
+
+
+class CountingFactory(object):
+
+    def __init__(self):
+        self.references = 0
+
+    def lease(self):
+        return self
+
+    def create(self, embedder_mode):
+        self.references += 1
+        return embedder_mode
+
+    def release(self):
+        self.references -= 1
+
+
+class StoredModelsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        for model_id in [1, 2]:
+            save_model_params(os.path.join(self.directory, "{}.cube".format(model_id)),
+                              {"label": "label {}".format(model_id)})
+
+        self.config = configparser.ConfigParser()
+        self.config["test-service"] = {
+            "MODEL_STORAGE": self.directory,
+            "MODEL_CACHE_SIZE": "1",
+            "PREDICTION_CACHE_SIZE": "10",
+        }
+        self.factory = CountingFactory()
+
+    def test_predict(self):
+        models = StoredModels(self.config, "test-service", LabelModel, self.factory,
+                              logging.getLogger("StoredModelsTest"), create_service_metrics())
+        calls = list()
+
+        def predict(model, queries):
+            calls.append(queries)
+            return model(queries)
+
+        self.assertEqual(["label 1"], models.predict(1, ["a"], predict))
+        self.assertEqual(["label 1", "label 1"], models.predict(1, ["a", "b"], predict))
+        self.assertEqual([["a"], ["b"]], calls)
+        self.assertEqual([], models.predict(1, [], predict))
+
+        # evicted model releases its embedders
+        self.assertEqual(["label 2"], models.predict(2, ["a"], predict))
+        self.assertEqual(1, self.factory.references)
+
+        with self.assertRaises(ValueError):
+            models.predict(3, ["a"], predict)
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from deepcubes_services.services.model_registry import ModelRegistry
+from deepcubes_services.services.model_storage import FORMAT_JSON, save_model_params
+
+
+class ModelRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model_storage = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.model_storage)
+
+    def test_import_existing_models(self):
+        for model_id in [0, 3]:
+            save_model_params(os.path.join(self.model_storage, "{}.cube".format(model_id)),
+                              {"labels": ["a"]}, FORMAT_JSON)
+
+        registry = ModelRegistry(self.model_storage)
+        self.assertEqual([0, 3], [model["model_id"] for model in registry.list()])
+        self.assertEqual(FORMAT_JSON, registry.get(3)["model_format"])
+        self.assertEqual(4, registry.allocate())
+
+    def test_allocate_and_register(self):
+        registry = ModelRegistry(self.model_storage)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            model_ids = list(executor.map(lambda _: registry.allocate("eng", "test"),
+                                          range(32)))
+
+        self.assertEqual(list(range(32)), sorted(model_ids))
+        self.assertEqual([], registry.list())
+
+        save_model_params(registry.get_model_path(5), {"labels": ["a"]})
+        registry.register(5)
+
+        models = registry.list(lang="eng")
+        self.assertEqual([5], [model["model_id"] for model in models])
+        self.assertEqual("test", models[0]["embedder_mode"])
+        self.assertEqual(os.path.getsize(registry.get_model_path(5)), models[0]["size"])
+
+        registry.discard(31)
+        self.assertIsNone(registry.get(31))
+        self.assertEqual(31, registry.allocate())
+
+
+if __name__ == "__main__":
+    unittest.main()
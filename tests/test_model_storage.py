@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from deepcubes_services.services.model_storage import (
+    ARRAY_KEY,
+    FORMAT_BINARY,
+    load_model_params,
+    save_model_params,
+)
+
+
+class ModelStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.tmp_dir.name, "0.cube")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_binary_round_trip(self):
+        params = {
+            "vectors": [[0.5 * row + column for column in range(8)] for row in range(4)],
+            "weights": [0.25 * index for index in range(20)],
+            "mixed": [index if index % 2 else float(index) for index in range(20)],
+            "ids": list(range(20)),
+            "user_dict": {ARRAY_KEY: 1, "~key": "value"},
+        }
+
+        save_model_params(self.model_path, params, FORMAT_BINARY)
+        loaded_params = load_model_params(self.model_path)
+
+        self.assertEqual(params, loaded_params)
+        self.assertIsInstance(loaded_params["vectors"], list)
+        self.assertEqual([float, int], [type(number) for number in loaded_params["mixed"][:2]])
+
+        arrays_params = load_model_params(self.model_path, arrays=True)
+        self.assertIsInstance(arrays_params["vectors"], np.ndarray)
+        self.assertEqual((4, 8), arrays_params["vectors"].shape)
+        self.assertIsInstance(arrays_params["mixed"], list)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import logging
+import unittest
+
+import numpy as np
+
+from deepcubes_services.services import MultistageClassifierService
+from deepcubes_services.services.embedders import SharedQueriesFactory
+from deepcubes_services.services.metrics import create_service_metrics
+from deepcubes_services.services.multistage_classifier_service import RecordedModel
+
+
+class CountingEmbedder(object):
+
+    def __init__(self):
+        self.batches = list()
+
+    def encode_queries(self, queries):
+        self.batches.append(list(queries))
+        return np.array([[float(len(query))] for query in queries])
+
+
+class CountingFactory(object):
+
+    def __init__(self):
+        self.embedder = CountingEmbedder()
+
+    def create(self, embedder_mode, tokenizer_mode=None):
+        return self.embedder
+
+
+class StageModel(object):
+    """Test classifier, returns fixed probabilities for every query"""
+
+    def __init__(self, embedder, probas):
+        self.embedder = embedder
+        self.probas = probas
+        self.calls = list()
+
+    def __call__(self, queries):
+        self.calls.append(list(queries))
+        self.embedder.encode_queries(queries)
+        return [dict(self.probas[query]) for query in queries]
+
+
+class TwoStageModel(object):
+    """Test multistage model: minor model refines `group` answers of major one"""
+
+    def __init__(self, major, minor):
+        self.major = major
+        self.minor = minor
+
+    def __call__(self, queries):
+        labels = [max(probas, key=probas.get) for probas in self.major(queries)]
+
+        grouped = [query for query, label in zip(queries, labels) if label == "group"]
+        if len(grouped):
+            minor_labels = {query: max(probas, key=probas.get)
+                            for query, probas in zip(grouped, self.minor(grouped))}
+            labels = [minor_labels.get(query, label) for query, label in zip(queries, labels)]
+
+        return labels
+
+
+class MultistageClassifierServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = CountingFactory()
+        shared_factory = SharedQueriesFactory(self.factory)
+        embedder = shared_factory.create("test")
+
+        self.major = StageModel(embedder, {
+            "hello": {"hello": 0.9, "group": 0.1},
+            "price": {"hello": 0.2, "group": 0.8},
+        })
+        self.minor = StageModel(embedder, {
+            "price": {"price": 0.7, "delivery": 0.3},
+        })
+
+        # service without models loading from storage
+        self.service = MultistageClassifierService.__new__(MultistageClassifierService)
+        self.service.logger = logging.getLogger("MultistageClassifierTestService")
+        self.service.metrics = create_service_metrics()
+        self.service.shared_factory = shared_factory
+        self.service.major_model = RecordedModel(self.major)
+        self.service.minor_model = RecordedModel(self.minor)
+        self.service.multistage_model = TwoStageModel(self.service.major_model,
+                                                      self.service.minor_model)
+
+    def test_predict_once(self):
+        output = self.service.predict(["hello", "price"])
+
+        self.assertEqual(["hello", "price"], [answer["answer"] for answer in output])
+        self.assertEqual([0.9, 0.7], [answer["probability"] for answer in output])
+
+        # every stage runs once and every query is embedded once
+        self.assertEqual([["hello", "price"]], self.major.calls)
+        self.assertEqual([["price"]], self.minor.calls)
+        self.assertEqual([["hello", "price"]], self.factory.embedder.batches)
+
+    def test_predict_batch(self):
+        service = self.service.create_flask_app().test_client()
+
+        output = service.post('/predict_batch', json={'queries': ['price', 'hello']}).get_json()
+        self.assertEqual(["price", "hello"], [answer["answer"] for answer in output])
+
+        output = service.post('/predict', json={'query': 'price'}).get_json()
+        self.assertEqual("price", output[0]["answer"])
+        self.assertEqual(0.7, output[0]["probability"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import logging
+import os
+import queue
+import tempfile
+import threading
+import unittest
+
+from deepcubes_services.services.request_logging import (
+    NonBlockingQueueHandler,
+    RequestSampler,
+    log_request,
+    setup_logging,
+    stop_logging,
+)
+
+
+class RecordsHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = list()
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class RequestLoggingTest(unittest.TestCase):
+
+    def get_logger(self, name, sample_rate):
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+        handler = RecordsHandler()
+        handler.addFilter(RequestSampler(sample_rate))
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        return logger, handler
+
+    def test_sampling(self):
+        logger, handler = self.get_logger("RequestLoggingTest.sampling", 0.0)
+
+        logger.info("Started service")
+        log_request(logger, "predict", model_id=1, query="hello")
+        logger.error("error when handling HTTP request")
+
+        self.assertEqual([record.getMessage() for record in handler.records],
+                         ["Started service", "error when handling HTTP request"])
+
+        logger, handler = self.get_logger("RequestLoggingTest.all", 1.0)
+        log_request(logger, "predict", model_id=1, query="hello")
+
+        self.assertEqual(handler.records[0].request_log, {"model_id": 1, "query": "hello"})
+        self.assertEqual(handler.records[0].getMessage(), "predict model_id=1 query='hello'")
+
+    def test_queue_handler(self):
+        records_queue = queue.Queue(1)
+        handler = NonBlockingQueueHandler(records_queue, block_timeout=0.01)
+
+        logger = logging.getLogger("RequestLoggingTest.queue")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        log_request(logger, "predict", model_id=1)
+        log_request(logger, "predict", model_id=2)
+        self.assertEqual(handler.dropped, 1)
+
+        # message is not formatted by request thread
+        self.assertFalse(hasattr(records_queue.get_nowait(), "message"))
+
+        # dropped count is reported with the next record when queue has place
+        logger.error("error when handling HTTP request")
+        self.assertEqual(records_queue.get_nowait().levelno, logging.ERROR)
+        handler.report_dropped()
+        self.assertEqual(records_queue.get_nowait().getMessage(),
+                         "1 log records were dropped, log queue was full")
+
+    def test_errors_wait_for_queue(self):
+        records_queue = queue.Queue(1)
+        handler = NonBlockingQueueHandler(records_queue, block_timeout=5.0)
+
+        logger = logging.getLogger("RequestLoggingTest.errors")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        log_request(logger, "predict", model_id=1)
+
+        consumer = threading.Timer(0.05, records_queue.get)
+        consumer.start()
+        logger.error("error when handling HTTP request")
+        consumer.join()
+
+        self.assertEqual(handler.dropped, 0)
+        self.assertEqual(records_queue.get_nowait().levelno, logging.ERROR)
+
+    def test_setup_logging(self):
+        with tempfile.TemporaryDirectory() as path:
+            log_path = os.path.join(path, "service.log")
+            logger = setup_logging("RequestLoggingTest.setup", log_path)
+            logger.propagate = False
+
+            handler = logger.handlers[0]
+            self.addCleanup(logger.removeHandler, handler)
+
+            log_request(logger, "predict", model_id=3)
+            logger.error("error when handling HTTP request")
+
+            # listener writes queued records before stop
+            stop_logging(logger)
+
+            with open(log_path) as log_file:
+                lines = log_file.read().splitlines()
+
+            self.assertEqual(len(lines), 2)
+            self.assertTrue(lines[0].endswith("| INFO | predict model_id=3"))
+            self.assertTrue(lines[1].endswith("| ERROR | error when handling HTTP request"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from deepcubes_services.services.sentiment_model import compare_models
+
+
+class FixedSentiment(object):
+    """Test model, returns positive probability of every query from dict"""
+
+    def __init__(self, probas):
+        self.probas = probas
+        self.batches = list()
+
+    def __call__(self, queries):
+        self.batches.append(list(queries))
+        return [self.probas[query] for query in queries]
+
+
+class CompareModelsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queries = ["good", "bad", "fine", "meh"]
+        self.reference = FixedSentiment({"good": 0.9, "bad": 0.1, "fine": 0.55, "meh": 0.4})
+
+    def test_agreement(self):
+        model = FixedSentiment({"good": 0.88, "bad": 0.12, "fine": 0.45, "meh": 0.4})
+
+        result = compare_models(self.reference, model, self.queries, batch_size=3,
+                                tolerance=0.2)
+
+        self.assertAlmostEqual(0.1, result["max_abs_diff"])
+        # only `fine` changes its label
+        self.assertEqual(0.75, result["agreement"])
+        self.assertTrue(result["passed"])
+        self.assertEqual([["good", "bad", "fine"], ["meh"]], model.batches)
+
+    def test_tolerance(self):
+        model = FixedSentiment({"good": 0.6, "bad": 0.1, "fine": 0.55, "meh": 0.4})
+
+        result = compare_models(self.reference, model, self.queries, tolerance=0.02)
+        self.assertAlmostEqual(0.3, result["max_abs_diff"])
+        self.assertEqual(1.0, result["agreement"])
+        self.assertFalse(result["passed"])
+
+        self.assertTrue(compare_models(self.reference, model, self.queries)["passed"])
+
+    def test_no_queries(self):
+        result = compare_models(self.reference, self.reference, [], tolerance=0.0)
+        self.assertEqual((0.0, 1.0, True),
+                         (result["max_abs_diff"], result["agreement"], result["passed"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import logging
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from deepcubes_services.services import SentimentService
+
+
+class LengthSentiment(object):
+    """Test model, positive probability is 1 / query length"""
+
+    def __init__(self):
+        self.batches = list()
+
+    def __call__(self, queries):
+        self.batches.append(list(queries))
+        return [1.0 / len(query) for query in queries]
+
+
+class SentimentServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("SentimentTestService")
+        self.model = LengthSentiment()
+
+    def test_requests(self):
+        service = SentimentService(self.logger, self.model).create_flask_app().test_client()
+
+        resp_data = service.post('/sentiment', json={'query': 'abcd'}).get_json()
+        self.assertEqual(0.25, resp_data['positive_proba'])
+
+        resp_data = service.get('/sentiment?query=ab').get_json()
+        self.assertEqual(0.5, resp_data['positive_proba'])
+
+        resp_data = service.post('/sentiment_batch', json={'queries': ['a', 'ab']}).get_json()
+        self.assertEqual([1.0, 0.5], [item['positive_proba'] for item in resp_data])
+
+        resp_data = service.post('/sentiment_batch', json={'queries': []}).get_json()
+        self.assertEqual([], resp_data)
+
+    def test_wrong_queries(self):
+        service = SentimentService(self.logger, self.model).create_flask_app().test_client()
+
+        self.assertEqual(400, service.get('/sentiment').status_code)
+        self.assertEqual(400, service.post('/sentiment', json={'query': 5}).status_code)
+        self.assertEqual(400, service.post('/sentiment_batch',
+                                           json={'queries': ['a', None]}).status_code)
+        self.assertEqual([], self.model.batches)
+
+    def test_batch_size(self):
+        for batching in [True, False]:
+            self.model.batches = list()
+            service = SentimentService(self.logger, self.model, batching=batching,
+                                       max_batch_size=4).create_flask_app().test_client()
+
+            queries = ['a' * length for length in range(1, 11)]
+            resp_data = service.post('/sentiment_batch', json={'queries': queries}).get_json()
+
+            self.assertEqual([1.0 / len(query) for query in queries],
+                             [item['positive_proba'] for item in resp_data])
+            self.assertEqual([4, 4, 2], [len(batch) for batch in self.model.batches])
+
+    def test_batching(self):
+        service = SentimentService(self.logger, self.model, max_batch_size=8,
+                                   max_batch_wait_ms=50)
+        queries = ['a' * length for length in range(1, 17)]
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(lambda query: service.predict([query])[0], queries))
+
+        self.assertEqual([1.0 / len(query) for query in queries], results)
+        self.assertLess(len(self.model.batches), len(queries))
+        self.assertTrue(all(len(batch) <= 8 for batch in self.model.batches))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import configparser
+import json
+import logging
+import os
+import unittest
+
+from werkzeug.test import Client
+
+from deepcubes_services.services.host import ServiceHost
+
+
+class ServiceHostTest(unittest.TestCase):
+
+    def setUp(self):
+        logger = logging.getLogger("ServiceHostTest")
+
+        config_parser = configparser.ConfigParser()
+        config_parser.read("tests/data/service_host/service_host.conf")
+
+        self.host = ServiceHost(config_parser, logger)
+        self.client = Client(self.host.create_app())
+
+        self.models_storage = 'tests/models/live_dialog'
+        with open('tests/data/vera_live_dialog/test.config', 'r') as conf_file:
+            self.test_config = conf_file.read()
+
+        self.test_models_list = list()
+
+    def test_in_process_embedders(self):
+        # embedder path of live dialog section is unavailable, so training
+        # works only through in-process embedder service
+        train_resp = self.client.post('/live_dialog/train', json={'config': self.test_config})
+        model_id = json.loads(train_resp.data.decode('utf-8'))['model_id']
+        self.test_models_list.append(model_id)
+
+        predict_resp = self.client.post('/live_dialog/predict', json={
+            'model_id': model_id, 'query': 'привет'})
+        self.assertEqual(200, predict_resp.status_code)
+
+        vectors_resp = self.client.post('/embedder/test_embeds/encode_queries',
+                                        json={'queries': ['привет']})
+        self.assertEqual(1, len(json.loads(vectors_resp.data.decode('utf-8'))['vectors']))
+
+        services = json.loads(self.client.get('/services').data.decode('utf-8'))
+        self.assertEqual(['embedder', 'live_dialog'], services['services'])
+        # embedder is used by trained model and by preloaded generic bank
+        self.assertEqual({'test_embeds/token': 2}, services['embedders'])
+
+    def tearDown(self):
+        for model_id in self.test_models_list:
+            os.remove(os.path.join(self.models_storage, '{}.cube'.format(model_id)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import json
+import logging
+import unittest
+
+import requests
+
+from deepcubes_services.services.shard_router import HashRing, ShardRouter
+
+
+class HashRingTest(unittest.TestCase):
+
+    def test_consistency(self):
+        ring = HashRing(["a", "b", "c"])
+        owners = {key: ring.get_nodes(key)[0] for key in range(1000)}
+
+        for node in ["a", "b", "c"]:
+            self.assertGreater(list(owners.values()).count(node), 200)
+
+        # only keys of removed node move
+        smaller_ring = HashRing(["a", "b"])
+        for key, owner in owners.items():
+            if owner != "c":
+                self.assertEqual(owner, smaller_ring.get_nodes(key)[0])
+
+        nodes = ring.get_nodes(7, 2)
+        self.assertEqual(2, len(set(nodes)))
+        self.assertEqual(nodes[0], owners[7])
+        self.assertEqual(3, len(ring.get_nodes(7, 5)))
+
+
+class _Response(object):
+
+    def __init__(self, content, content_type="text/plain"):
+        self.content = content.encode("utf-8")
+        self.status_code = 200
+        self.headers = {"Content-Type": content_type}
+
+
+class _Session(object):
+
+    def __init__(self, down=(), error=requests.ConnectionError):
+        self.down = set(down)
+        self.error = error
+        self.requests = list()
+
+    def request(self, method, url, **kwargs):
+        worker, path = url.split("/", 3)[2:]
+        worker = "http://" + worker
+        self.requests.append(worker)
+
+        if worker in self.down:
+            raise self.error("{} is down".format(worker))
+
+        # every worker knows only its own jobs
+        if path == "train":
+            return _Response(json.dumps({"job_id": "job"}), "application/json")
+        if path.startswith("train_status/"):
+            return _Response(json.dumps({"job_id": path.split("/")[1], "worker": worker}),
+                             "application/json")
+        if path == "model_cache_stats":
+            return _Response(json.dumps({"size": len(worker)}), "application/json")
+
+        return _Response(worker)
+
+
+class ShardRouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workers = ["http://w0", "http://w1", "http://w2"]
+        self.logger = logging.getLogger("ShardRouterTest")
+
+    def test_model_routing(self):
+        router = ShardRouter(self.logger, self.workers, hot_models=[5], session=_Session())
+        service = router.create_flask_app().test_client()
+
+        for model_id in range(6, 20):
+            worker = service.post("/predict", json={"model_id": model_id}).data.decode("utf-8")
+            self.assertEqual(router.get_model_workers(model_id), [worker])
+
+        hot_workers = {service.post("/predict", data={"model_id": 5}).data.decode("utf-8")
+                       for _ in range(6)}
+        self.assertEqual(set(self.workers), hot_workers)
+
+        shard = router.get_shard("http://w0", list(range(20)))
+        self.assertIn(5, shard)
+        self.assertTrue(all("http://w0" in router.get_model_workers(model_id)
+                            for model_id in shard))
+
+    def test_failover(self):
+        owner = HashRing(self.workers).get_nodes(3)[0]
+        session = _Session(down=[owner])
+
+        router = ShardRouter(self.logger, self.workers, session=session)
+        service = router.create_flask_app().test_client()
+
+        worker = service.post("/predict", json={"model_id": 3}).data.decode("utf-8")
+        self.assertNotEqual(owner, worker)
+        self.assertEqual([owner, worker], session.requests)
+
+    def test_worker_errors(self):
+        for error, status in [(requests.ReadTimeout, 504),
+                              (requests.exceptions.ChunkedEncodingError, 502)]:
+            session = _Session(down=self.workers, error=error)
+            router = ShardRouter(self.logger, self.workers, session=session)
+            service = router.create_flask_app().test_client()
+
+            for _ in range(3):
+                response = service.post("/train", json={"config": "{}"})
+                self.assertEqual(status, response.status_code)
+
+            # timed out request may be handled by worker, so it isn't sent again
+            self.assertEqual(3, len(session.requests))
+            self.assertEqual([0] * len(self.workers),
+                             [stats["outstanding"] for stats in router.balancer.stats().values()])
+
+        session = _Session(down=self.workers)
+        router = ShardRouter(self.logger, self.workers, session=session)
+        response = router.create_flask_app().test_client().post("/predict", json={"model_id": 1})
+        self.assertEqual(502, response.status_code)
+        self.assertEqual(len(self.workers), len(session.requests))
+
+    def test_train_status(self):
+        router = ShardRouter(self.logger, self.workers, session=_Session())
+        service = router.create_flask_app().test_client()
+
+        for _ in range(len(self.workers)):
+            job_id = service.post("/train", json={"config": "{}"}).get_json()["job_id"]
+            worker = self.workers[int(job_id.split("-")[0])]
+
+            for _ in range(3):
+                status = service.get("/train_status/{}".format(job_id)).get_json()
+                self.assertEqual(worker, status["worker"])
+                self.assertEqual(job_id, status["job_id"])
+
+        self.assertEqual(400, service.get("/train_status/job").status_code)
+        self.assertEqual(400, service.get("/train_status/7-job").status_code)
+
+    def test_workers_stats(self):
+        router = ShardRouter(self.logger, self.workers, session=_Session(down=["http://w2"]))
+        service = router.create_flask_app().test_client()
+
+        stats = service.get("/model_cache_stats").get_json()["workers"]
+        self.assertEqual(set(self.workers), set(stats))
+        self.assertEqual({"size": len("http://w0")}, stats["http://w0"])
+        self.assertIn("error", stats["http://w2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
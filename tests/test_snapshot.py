@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from deepcubes_services.services.snapshot import (get_files_fingerprint, load_snapshot,
+                                                  save_snapshot)
+
+
+class GroupsModel(object):
+    """Test model with trained groups and reference to loaded model"""
+
+    def __init__(self, minor):
+        self.minor = minor
+        self.groups = None
+
+    def train(self):
+        self.groups = {"a": (1, 2), 3: [0.5, None], "weights": np.arange(4, dtype=np.float32)}
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.directory, "groups.csv")
+        self.snapshot_path = os.path.join(self.directory, "model.snapshot")
+
+        with open(self.input_path, "w") as out:
+            out.write("label,group\n")
+
+        # lock can't be serialized, so loaded model is stored by reference
+        self.minor = {"lock": threading.Lock()}
+        self.model = GroupsModel(self.minor)
+        self.model.train()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fingerprint(self):
+        fingerprint = get_files_fingerprint([self.input_path])
+        self.assertEqual(fingerprint, get_files_fingerprint([self.input_path]))
+
+        save_snapshot(self.snapshot_path, fingerprint, self.model, {"minor": self.minor})
+        loaded = load_snapshot(self.snapshot_path, fingerprint, GroupsModel,
+                               {"minor": self.minor})
+        self.assertIs(self.minor, loaded.minor)
+        self.assertEqual((1, 2), loaded.groups["a"])
+        self.assertEqual([0.5, None], loaded.groups[3])
+        self.assertEqual(np.float32, loaded.groups["weights"].dtype)
+        np.testing.assert_array_equal(self.model.groups["weights"], loaded.groups["weights"])
+
+        with open(self.input_path, "a") as out:
+            out.write("hello,a\n")
+
+        changed_fingerprint = get_files_fingerprint([self.input_path])
+        self.assertNotEqual(fingerprint, changed_fingerprint)
+        self.assertIsNone(load_snapshot(self.snapshot_path, changed_fingerprint, GroupsModel,
+                                        {"minor": self.minor}))
+        self.assertIsNone(load_snapshot(self.snapshot_path + ".absent", fingerprint,
+                                        GroupsModel))
+
+    def test_manifest_and_version(self):
+        shared = {"minor": self.minor}
+        save_snapshot(self.snapshot_path, "fingerprint", self.model, shared, {"minor_id": 2})
+
+        self.assertIsNotNone(load_snapshot(self.snapshot_path, "fingerprint", GroupsModel,
+                                           shared, {"minor_id": 2}))
+        self.assertIsNone(load_snapshot(self.snapshot_path, "fingerprint", GroupsModel,
+                                        shared, {"minor_id": 3}))
+        self.assertIsNone(load_snapshot(self.snapshot_path, "fingerprint", dict, shared,
+                                        {"minor_id": 2}))
+
+        with open(self.snapshot_path) as snapshot_file:
+            data = json.load(snapshot_file)
+        data["version"] = 1
+        with open(self.snapshot_path, "w") as snapshot_file:
+            json.dump(data, snapshot_file)
+
+        self.assertIsNone(load_snapshot(self.snapshot_path, "fingerprint", GroupsModel,
+                                        shared, {"minor_id": 2}))
+
+        # not JSON snapshot (e.g. pickled one) is ignored
+        with open(self.snapshot_path, "wb") as snapshot_file:
+            snapshot_file.write(b"\x80\x04\x95")
+        self.assertIsNone(load_snapshot(self.snapshot_path, "fingerprint", GroupsModel,
+                                        shared, {"minor_id": 2}))
+
+    def test_unsupported_attributes(self):
+        with self.assertRaises(TypeError):
+            save_snapshot(self.snapshot_path, "fingerprint", self.model)
+
+        self.assertFalse(os.path.exists(self.snapshot_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,8 +3,18 @@ import json
 import os
 import logging
 import configparser
+import time
+
+import numpy as np
 
 from deepcubes_services.services import VeraLiveDialogService
+from deepcubes_services.services.model_storage import (
+    FORMAT_BINARY,
+    FORMAT_JSON,
+    convert_model_file,
+    get_model_format,
+    load_model_params,
+)
 
 
 class VeraLiveDialogServiceTest(unittest.TestCase):
@@ -13,15 +23,7 @@ class VeraLiveDialogServiceTest(unittest.TestCase):
         logger = logging.getLogger("VeraLiveDialogTestService")
         logger.setLevel(logging.INFO)
 
-        config_parser = configparser.ConfigParser()
-        config_parser.read(
-            "tests/data/vera_live_dialog/vera_live_dialog.conf"
-        )
-
-        app = VeraLiveDialogService(config_parser, logger).create_flask_app()
-        app.tesing = True
-
-        self.service = app.test_client()
+        self.service = self._create_service(logger)
 
         self.models_storage = 'tests/models/live_dialog'
         os.makedirs(self.models_storage, exist_ok=True)
@@ -118,6 +120,193 @@ class VeraLiveDialogServiceTest(unittest.TestCase):
 
         self.assertEqual(3, len(labels))
 
+    def test_prediction_cache(self):
+        logger = logging.getLogger("VeraLiveDialogTestService")
+
+        config_parser = configparser.ConfigParser()
+        config_parser.read(
+            "tests/data/vera_live_dialog/vera_live_dialog.conf"
+        )
+        config_parser.set("live-dialog-service", "PREDICTION_CACHE_SIZE", "100")
+        # model file version is checked on every request
+        config_parser.set("live-dialog-service", "MODEL_CACHE_VERSION_INTERVAL", "0")
+
+        app = VeraLiveDialogService(config_parser, logger).create_flask_app()
+        self.service = app.test_client()
+
+        train_resp = self.service.post('/train', json=self.request_data)
+        model_id = json.loads(train_resp.data.decode("utf-8"))['model_id']
+        self.test_models_list.append(model_id)
+
+        first_resp_data = self._get_predict_response(query='привет', model_id=model_id)
+        second_resp_data = self._get_predict_response(query='привет', model_id=model_id)
+        self.assertEqual(first_resp_data, second_resp_data)
+
+        stats = self.service.get('/prediction_cache_stats').get_json()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+
+        # rewritten model file invalidates cached predictions
+        model_path = os.path.join(self.models_storage, '{}.cube'.format(model_id))
+        with open(model_path, 'rb') as model_file:
+            model_data = model_file.read()
+        os.remove(model_path)
+        with open(model_path, 'wb') as model_file:
+            model_file.write(model_data)
+
+        self._get_predict_response(query='привет', model_id=model_id)
+        stats = self.service.get('/prediction_cache_stats').get_json()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(2, stats['misses'])
+
+    def test_async_train(self):
+        logger = logging.getLogger("VeraLiveDialogTestService")
+
+        config_parser = configparser.ConfigParser()
+        config_parser.read(
+            "tests/data/vera_live_dialog/vera_live_dialog.conf"
+        )
+        config_parser.set("live-dialog-service", "TRAIN_ASYNC", "true")
+
+        app = VeraLiveDialogService(config_parser, logger).create_flask_app()
+        self.service = app.test_client()
+
+        train_resp_data = self.service.post('/train', json=self.request_data).get_json()
+        self.assertNotIn('model_id', train_resp_data)
+        job_id = train_resp_data['job_id']
+
+        for _ in range(600):
+            status = self.service.get('/train_status/{}'.format(job_id)).get_json()
+            if status['status'] in ['done', 'failed']:
+                break
+            time.sleep(0.1)
+
+        self.assertEqual('done', status['status'])
+        model_id = status['model_id']
+        self.test_models_list.append(model_id)
+
+        predict_resp_data = self._get_predict_response(query='привет', model_id=model_id)
+        self.assertEqual('hello', predict_resp_data[0]['label'])
+
+        status_resp = self.service.get('/train_status/unknown')
+        self.assertEqual(400, status_resp.status_code)
+
+    def test_update_request(self):
+        self.service = self._create_service(save_train_data='true')
+        train_resp_data = self.service.post('/train', json=self.request_data).get_json()
+        model_id = train_resp_data['model_id']
+        self.test_models_list.append(model_id)
+        trained_labels, _ = self._dicts_to_values_list(
+            self._get_predict_response(query='привет', model_id=model_id))
+
+        update = {
+            'add': {'salary': {'intent_phrases': ['когда зарплата']}},
+            'remove_labels': ['robot'],
+        }
+        update_resp = self.service.post('/update', json={
+            'model_id': model_id,
+            'update': json.dumps(update),
+        })
+        update_resp_data = update_resp.get_json()
+
+        self.assertEqual(model_id, update_resp_data['model_id'])
+        self.assertEqual(1, update_resp_data['encoded_phrases'])
+
+        predict_resp_data = self._get_predict_response(query='привет', model_id=model_id)
+        labels, probs = self._dicts_to_values_list(predict_resp_data)
+        self.assertEqual(set(trained_labels) - {'robot'}, set(labels))
+
+        update_resp = self.service.post('/update', json={
+            'model_id': model_id,
+            'update': {'remove_labels': ['unknown']},
+        })
+        self.assertEqual(400, update_resp.status_code)
+
+    def test_train_data_is_optional(self):
+        train_resp_data = self.service.post('/train', json=self.request_data).get_json()
+        model_id = train_resp_data['model_id']
+        self.test_models_list.append(model_id)
+
+        self.assertFalse(os.path.exists(
+            os.path.join(self.models_storage, '{}.train'.format(model_id))))
+
+        update_resp = self.service.post('/update', json={
+            'model_id': model_id,
+            'update': {'remove_labels': ['robot']},
+        })
+        self.assertEqual(400, update_resp.status_code)
+
+    def test_binary_model_format(self):
+        train_resp_data = self.service.post('/train', json=self.request_data).get_json()
+        model_id = train_resp_data['model_id']
+        self.test_models_list.append(model_id)
+
+        model_path = os.path.join(self.models_storage, '{}.cube'.format(model_id))
+        self.assertEqual(FORMAT_JSON, get_model_format(model_path))
+        json_params = load_model_params(model_path)
+        json_output = self._get_predict_response(query='привет', model_id=model_id)
+
+        self.assertTrue(convert_model_file(model_path, FORMAT_BINARY))
+        self.assertEqual(json_params, load_model_params(model_path))
+
+        # new service loads the model from binary file
+        config_parser = configparser.ConfigParser()
+        config_parser.read("tests/data/vera_live_dialog/vera_live_dialog.conf")
+        self.service = VeraLiveDialogService(
+            config_parser, logging.getLogger("VeraLiveDialogTestService")
+        ).create_flask_app().test_client()
+
+        binary_output = self._get_predict_response(query='привет', model_id=model_id)
+        self.assertEqual(len(json_output), len(binary_output))
+        for json_answer, binary_answer in zip(json_output, binary_output):
+            self.assertEqual(json_answer['label'], binary_answer['label'])
+            self.assertAlmostEqual(json_answer['proba'], binary_answer['proba'], 5)
+
+    def test_generic_bank(self):
+        for _ in range(2):
+            train_resp_data = self.service.post('/train', json=self.request_data).get_json()
+            self.test_models_list.append(train_resp_data['model_id'])
+
+        stats = self.service.get('/generic_bank_stats').get_json()
+        self.assertEqual(['test_embeds'], stats['modes'])
+        self.assertEqual(1, stats['builds'])
+
+    def test_generic_bank_preload(self):
+        config_parser = configparser.ConfigParser()
+        config_parser.read("tests/data/vera_live_dialog/vera_live_dialog.conf")
+        service = VeraLiveDialogService(config_parser,
+                                        logging.getLogger("VeraLiveDialogTestService"))
+
+        # preloaded embedder is kept for the first training
+        self.assertEqual(1, len(service.embedder_factory.embedders()))
+
+        lease = service.embedder_factory.lease()
+        try:
+            _, vectors, _ = service._fit_model(json.loads(self.test_config), lease)
+        finally:
+            lease.release()
+
+        generic_vectors = service.generic_bank.get_vectors(lease.create('test_embeds'))
+        lease.release()
+        self.assertEqual(1, service.generic_bank.builds)
+        self.assertEqual({np.dtype(np.float32)},
+                         {vector.dtype for vector in vectors.values()} |
+                         {vector.dtype for vector in generic_vectors.values()})
+
+    def _create_service(self, logger=None, save_train_data='false'):
+        config_parser = configparser.ConfigParser()
+        config_parser.read(
+            "tests/data/vera_live_dialog/vera_live_dialog.conf"
+        )
+        config_parser.set('live-dialog-service', 'SAVE_TRAIN_DATA', save_train_data)
+
+        app = VeraLiveDialogService(
+            config_parser, logger or logging.getLogger("VeraLiveDialogTestService")
+        ).create_flask_app()
+        app.tesing = True
+
+        return app.test_client()
+
     def _get_predict_response(self, query, model_id, labels=None):
         predict_resp = self.service.post(
             '/predict', json={
@@ -140,3 +329,6 @@ class VeraLiveDialogServiceTest(unittest.TestCase):
             os.remove(
                 os.path.join(self.models_storage, '{}.cube'.format(model_id))
             )
+            train_data_path = os.path.join(self.models_storage, '{}.train'.format(model_id))
+            if os.path.exists(train_data_path):
+                os.remove(train_data_path)